@@ -1,14 +1,33 @@
 # app.py  ── (백업 기능만 추가 / 기존 변수·화면 변경 없음)
 
-from flask import Flask, render_template, request, redirect, session, flash, url_for, jsonify, send_file, send_from_directory
+from flask import Flask, render_template, request, redirect, session, flash, url_for, jsonify, send_file, send_from_directory, g, has_app_context, abort
 from flask_sqlalchemy import SQLAlchemy
+from flask_sqlalchemy.session import Session as FsaSession
 from datetime import datetime, timedelta
-import os, re, logging, shutil, time, sqlite3, json
+import os, re, logging, time, sqlite3, json, bisect, heapq, queue, threading, tempfile, gzip, secrets, subprocess
 from zoneinfo import ZoneInfo
 from math import ceil
+from functools import lru_cache
+from contextlib import contextmanager, ExitStack
+from types import SimpleNamespace
+from urllib.request import pathname2url
+from itertools import islice
+from collections import OrderedDict
 from werkzeug.utils import secure_filename
-from sqlalchemy import text
+from sqlalchemy import text, create_engine, event, inspect as sa_inspect, make_url
+from sqlalchemy.exc import DisconnectionError
+from sqlalchemy.orm import Session as SaSession
 from apscheduler.schedulers.background import BackgroundScheduler
+from jinja2 import FileSystemBytecodeCache
+from flask.sessions import SessionInterface, SessionMixin
+from flask.json.tag import TaggedJSONSerializer
+from werkzeug.datastructures import CallbackDict
+from itsdangerous import Signer, BadSignature
+
+try:  # 선택 의존성: 있으면 br 압축 사용
+    import brotli
+except ImportError:
+    brotli = None
 
 KST = ZoneInfo("Asia/Seoul")
 
@@ -21,14 +40,45 @@ EDIT_LOG_DATE_ENABLED = os.getenv('EDIT_LOG_DATE_ENABLED', '0') == '1'  # 교사
 # Secret
 app.secret_key = os.getenv('SECRET_KEY', 'your_secret_key')
 
+# 템플릿 바이트코드 캐시(워커 간 공유: 같은 디렉터리를 봄)
+TEMPLATE_CACHE_DIR = os.getenv('TEMPLATE_CACHE_DIR') or os.path.join(os.path.dirname(os.path.abspath(__file__)), ".jinja_cache")
+os.makedirs(TEMPLATE_CACHE_DIR, exist_ok=True)
+app.jinja_options = {**app.jinja_options, "bytecode_cache": FileSystemBytecodeCache(TEMPLATE_CACHE_DIR)}
+
 # DB 설정 (Postgres -> fallback SQLite)
 basedir = os.path.abspath(os.path.dirname(__file__))
 sqlite_path = os.getenv("SQLITE_PATH") or os.path.join(basedir, "consulting.db")
 database_url = os.getenv("DATABASE_URL") or ("sqlite:///" + sqlite_path.replace("\\", "/"))
+if database_url.startswith("postgres://"):   # Render/Heroku 형식 → SQLAlchemy 형식
+    database_url = "postgresql://" + database_url[len("postgres://"):]
+
+def _engine_options(url):
+    """Postgres 는 커넥션 풀을 명시적으로 조정(끊긴 연결 감지·주기적 재연결)."""
+    if url.startswith("postgresql"):
+        return {
+            "pool_size": int(os.getenv("DB_POOL_SIZE", "5")),
+            "max_overflow": int(os.getenv("DB_MAX_OVERFLOW", "5")),
+            "pool_timeout": int(os.getenv("DB_POOL_TIMEOUT", "30")),
+            "pool_recycle": int(os.getenv("DB_POOL_RECYCLE", "1800")),
+            "pool_pre_ping": True,
+        }
+    return {}
 
 app.config['SQLALCHEMY_DATABASE_URI'] = database_url
+app.config['SQLALCHEMY_ENGINE_OPTIONS'] = _engine_options(database_url)
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
-db = SQLAlchemy(app)
+
+class TenantSession(FsaSession):
+    """요청의 학교(테넌트)에 맞는 엔진으로 라우팅. 기본 학교는 원래 엔진(db.engine)을 쓴다."""
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None:
+            tenant = current_tenant()
+            if not tenant.is_default:
+                return tenant_engines.get(tenant)
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+db = SQLAlchemy(app, session_options={"class_": TenantSession})
 
 # 로깅
 logging.basicConfig(level=logging.INFO, format='[%(levelname)s] %(message)s')
@@ -37,17 +87,48 @@ def now_kst_str():
     return datetime.now(KST).strftime('%Y-%m-%d %H:%M')
 
 # 문자열 ↔ datetime 유틸
-def parse_dt(s: str):
-    """consulting.db 문자열 날짜를 datetime(KST)으로 파싱."""
-    if not s:
-        return None
-    for fmt in ('%Y-%m-%d %H:%M', '%Y/%m/%d %H:%M', '%Y.%m.%d %H:%M', '%Y-%m-%dT%H:%M'):
+_DT_FORMATS = ('%Y-%m-%d %H:%M', '%Y/%m/%d %H:%M', '%Y.%m.%d %H:%M', '%Y-%m-%dT%H:%M')
+DT_CACHE_SIZE = int(os.getenv('DT_CACHE_SIZE', '8192'))
+
+def _parse_dt_uncached(s: str):
+    # 빠른 경로: 'YYYY-MM-DD HH:MM' / 'YYYY-MM-DDTHH:MM' 는 strptime 없이 슬라이싱
+    if (len(s) == 16 and s[4] == '-' and s[7] == '-' and s[10] in ' T' and s[13] == ':'
+            and (s[0:4] + s[5:7] + s[8:10] + s[11:13] + s[14:16]).isdigit()):
+        try:
+            return datetime(int(s[0:4]), int(s[5:7]), int(s[8:10]),
+                            int(s[11:13]), int(s[14:16]), tzinfo=KST)
+        except ValueError:
+            return None
+    for fmt in _DT_FORMATS:
         try:
             return datetime.strptime(s, fmt).replace(tzinfo=KST)
         except ValueError:
             continue
     return None
 
+# 같은 문자열이 요청마다 반복 파싱되므로 LRU 캐시(datetime은 불변이라 공유해도 안전)
+_parse_dt_cached = lru_cache(maxsize=DT_CACHE_SIZE)(_parse_dt_uncached)
+
+def parse_dt(s: str):
+    """consulting.db 문자열 날짜를 datetime(KST)으로 파싱."""
+    if not s:
+        return None
+    return _parse_dt_cached(s)
+
+def parse_dt_many(values):
+    """여러 날짜 문자열을 한 번에 파싱(통계용). 입력 순서대로 datetime|None 리스트 반환."""
+    memo = {}
+    out = []
+    for s in values:
+        if not s:
+            out.append(None)
+            continue
+        dt = memo.get(s)
+        if dt is None and s not in memo:
+            dt = memo[s] = _parse_dt_cached(s)
+        out.append(dt)
+    return out
+
 def _to_input_value(dt_str_or_none):
     dt = parse_dt(dt_str_or_none) if dt_str_or_none else datetime.now(KST)
     return dt.astimezone(KST).strftime("%Y-%m-%dT%H:%M")  # input[type=datetime-local] 값
@@ -89,10 +170,137 @@ class QuestionTemplate(db.Model):
     teacher_id = db.Column(db.Integer, db.ForeignKey('teacher.id'), nullable=False)
     question = db.Column(db.Text, nullable=False)
 
-# SQLite 자동 생성
-if (database_url.startswith('sqlite:///') and not os.path.exists(sqlite_path)):
+class PendingRequest(db.Model):
+    """답변(ConsultLog)이 아직 없는 신청 대기열. 신청/답변/삭제 때 함께 갱신한다."""
+    request_id = db.Column(db.Integer, db.ForeignKey('consult_request.id'), primary_key=True)
+    grade = db.Column(db.Integer, nullable=False)
+    class_num = db.Column(db.Integer, nullable=False)
+    date = db.Column(db.String(20), nullable=False)   # 'YYYY-MM-DD HH:MM' 로 정규화(정렬용)
+    __table_args__ = (
+        db.Index('ix_pending_request_scope', 'grade', 'class_num', 'date'),
+        db.Index('ix_pending_request_date', 'date'),
+    )
+
+# === 답변 대기열 ===
+def _pending_date(s):
+    dt = parse_dt(s)
+    return dt.strftime('%Y-%m-%d %H:%M') if dt else (s or '')
+
+def pending_add(req):
+    db.session.add(PendingRequest(request_id=req.id, grade=req.grade,
+                                  class_num=req.class_num, date=_pending_date(req.date)))
+
+def pending_remove(req_id):
+    PendingRequest.query.filter_by(request_id=req_id).delete()
+
+def rebuild_pending_queue(conn):
+    """대기열을 consult_request/consult_log 로부터 다시 만든다(conn: SQLAlchemy Connection)."""
+    pr, cr, cl = PendingRequest.__table__, ConsultRequest.__table__, ConsultLog.__table__
+    conn.execute(pr.delete())
+    rows = conn.execute(
+        db.select(cr.c.id, cr.c.grade, cr.c.class_num, cr.c.date)
+        .where(~db.exists().where(cl.c.request_id == cr.c.id)))
+    batch = [{"request_id": i, "grade": g, "class_num": c, "date": _pending_date(d)} for i, g, c, d in rows]
+    if batch:
+        conn.execute(pr.insert(), batch)
+    return len(batch)
+
+def pending_summary(grade, class_num, limit=5):
+    """담임 반의 대기 건수 / 가장 오래 기다린 시간 / 오래된 순 목록(인덱스 조회)."""
+    base = PendingRequest.query.filter_by(grade=grade, class_num=class_num)
+    count = base.count()
+    oldest = (db.session.query(ConsultRequest, PendingRequest.date)
+              .join(PendingRequest, PendingRequest.request_id == ConsultRequest.id)
+              .filter(PendingRequest.grade == grade, PendingRequest.class_num == class_num)
+              .order_by(PendingRequest.date, PendingRequest.request_id)
+              .limit(limit).all())
+    now = datetime.now(KST)
+    items = []
+    for r, pdate in oldest:
+        dt = parse_dt(pdate)
+        items.append({"id": r.id, "date": r.date, "number": r.number, "name": r.name,
+                      "topic": r.topic, "waiting": _format_age(now - dt) if dt else "-"})
+    return {"count": count, "oldest_age": items[0]["waiting"] if items else None, "items": items}
+
+def recent_pending(limit, sess=None):
+    """전체 대기열에서 최근 신청 순 limit 건(통계용). sess: 분석 스냅샷 세션 등."""
+    rows = ((sess or db.session).query(ConsultRequest)
+            .join(PendingRequest, PendingRequest.request_id == ConsultRequest.id)
+            .order_by(PendingRequest.date.desc(), PendingRequest.request_id)
+            .limit(limit).all())
+    return [{"id": r.id, "date": r.date, "grade": r.grade, "class_num": r.class_num,
+             "number": r.number, "name": r.name, "topic": r.topic} for r in rows]
+
+def _format_age(td):
+    mins = max(0, int(td.total_seconds() // 60))
+    if mins < 60:
+        return f"{mins}분"
+    hours = mins // 60
+    if hours < 24:
+        return f"{hours}시간"
+    return f"{hours // 24}일 {hours % 24}시간"
+
+# 기존 DB 에도 적용하는 멱등 마이그레이션(인덱스 등, SQLite/Postgres 공통 SQL)
+DB_MIGRATIONS = [
+    "CREATE INDEX IF NOT EXISTS ix_consult_request_scope ON consult_request (grade, class_num, date)",
+    "CREATE INDEX IF NOT EXISTS ix_consult_log_request_id ON consult_log (request_id)",
+]
+
+def apply_migrations(eng, rebuild_pending=False):
+    """빠진 테이블을 만들고 마이그레이션을 적용.
+
+    대기열 테이블이 새로 생겼거나 rebuild_pending 이면 대기열을 다시 채운다.
+    """
+    had_pending = sa_inspect(eng).has_table(PendingRequest.__tablename__)
+    db.metadata.create_all(eng)
+    with eng.begin() as conn:
+        for ddl in DB_MIGRATIONS:
+            conn.exec_driver_sql(ddl)
+        if rebuild_pending or not had_pending:
+            rebuild_pending_queue(conn)
+
+def apply_sqlite_migrations(path, rebuild_pending=False):
+    eng = create_engine("sqlite:///" + path.replace("\\", "/"))
+    try:
+        apply_migrations(eng, rebuild_pending)
+    finally:
+        eng.dispose()
+
+def _file_inode(path):
+    try:
+        return os.stat(path).st_ino
+    except OSError:
+        return None
+
+def follow_file_swaps(engine, path):
+    """DB 파일이 교체되면(os.replace = 새 inode) 이전 파일로 열린 풀 연결을 버린다.
+
+    업로드 교체는 그 프로세스의 풀만 비우므로, 다른 워커는 연결을 빌릴 때 inode 를 비교해
+    지워진 이전 파일에 쓰지 않게 한다(stat 1회).
+    """
+    @event.listens_for(engine, "connect")
+    def _remember_inode(dbapi_con, record):
+        record.info["inode"] = _file_inode(path)
+
+    @event.listens_for(engine, "checkout")
+    def _check_inode(dbapi_con, record, proxy):
+        if record.info.get("inode") != _file_inode(path):
+            raise DisconnectionError("DB 파일이 교체됨 - 다시 연결")   # 풀이 새 연결로 다시 시도
+
+    return engine
+
+# 자동 생성 + 마이그레이션
+if database_url.startswith('sqlite:///'):
+    apply_sqlite_migrations(sqlite_path)
     with app.app_context():
-        db.create_all()
+        follow_file_swaps(db.engine, sqlite_path)
+else:
+    try:
+        with app.app_context():
+            apply_migrations(db.engine)
+            db.engine.dispose()   # --preload: 포크 전에 풀을 비워 워커가 연결을 공유하지 않게
+    except Exception:
+        app.logger.exception("DB 마이그레이션 실패")
 
 # ====== 백업 설정 (추가) ======
 ADMIN_PW = os.getenv("ADMIN_PW", "PAJU2025")
@@ -100,16 +308,16 @@ BACKUP_DIR = os.path.join(basedir, "backups")
 STATE_PATH = os.path.join(BACKUP_DIR, ".state.json")
 os.makedirs(BACKUP_DIR, exist_ok=True)
 
-def _load_state():
+def _load_state(tenant=None):
     try:
-        with open(STATE_PATH, "r", encoding="utf-8") as f:
+        with open((tenant or current_tenant()).state_path, "r", encoding="utf-8") as f:
             return json.load(f)
     except Exception:
         return {}
 
-def _save_state(d):
+def _save_state(d, tenant=None):
     try:
-        with open(STATE_PATH, "w", encoding="utf-8") as f:
+        with open((tenant or current_tenant()).state_path, "w", encoding="utf-8") as f:
             json.dump(d, f)
     except Exception:
         pass
@@ -120,40 +328,39 @@ def mark_data_changed():
     st["dirty"] = True
     _save_state(st)
 
-def _backup_sqlite(dst_path: str):
+def _backup_sqlite(dst_path: str, src_path=None):
     if not database_url.startswith("sqlite:///"):
         raise RuntimeError("SQLite가 아닙니다.")
-    src = sqlite3.connect(sqlite_path)
+    src = sqlite3.connect(src_path or current_tenant().sqlite_path)
     dst = sqlite3.connect(dst_path)
     with dst:
         src.backup(dst)
     dst.close()
     src.close()
 
-def make_backup_now() -> str:
+def make_backup_now(tenant=None) -> str:
+    tenant = tenant or current_tenant()
     ts = time.strftime("%Y%m%d-%H%M%S", time.localtime())
-    out = os.path.join(BACKUP_DIR, f"consulting-{ts}.db")
-    if database_url.startswith("sqlite:///"):
-        _backup_sqlite(out)
-    else:
-        shutil.copyfile(sqlite_path, out)
-    st = _load_state()
+    out = os.path.join(tenant.backup_dir, f"consulting-{ts}{backend.backup_ext}")
+    backend.backup(out, tenant)
+    st = _load_state(tenant)
     st["dirty"] = False
     st["last_backup_ts"] = time.time()
     st["last_backup_file"] = os.path.basename(out)
-    _save_state(st)
+    _save_state(st, tenant)
     return out
 
 def _auto_backup_job():
-    st = _load_state()
-    if not st.get("dirty"):
-        return
-    last_change = st.get("last_change_ts", 0)
-    if time.time() - last_change >= 300:  # 5분
-        try:
-            make_backup_now()
-        except Exception as e:
-            app.logger.exception(f"자동 백업 실패: {e}")
+    for tenant in all_tenants():   # 학교마다 자기 백업 폴더/상태 파일
+        st = _load_state(tenant)
+        if not st.get("dirty"):
+            continue
+        last_change = st.get("last_change_ts", 0)
+        if time.time() - last_change >= 300:  # 5분
+            try:
+                make_backup_now(tenant)
+            except Exception as e:
+                app.logger.exception(f"자동 백업 실패({tenant.label}): {e}")
 
 scheduler = BackgroundScheduler(timezone="Asia/Seoul")
 scheduler.add_job(_auto_backup_job, "interval", seconds=60, id="auto_backup",
@@ -164,89 +371,1149 @@ except Exception:
     pass
 # ===========================
 
+# ====== DB 백엔드(SQLite / Postgres) ======
+# 백업·다운로드·업로드처럼 DB 종류에 따라 달라지는 부분만 모아 둔다.
+PG_DUMP = os.getenv("PG_DUMP", "pg_dump")
+PG_RESTORE = os.getenv("PG_RESTORE", "pg_restore")
+PG_TOOL_TIMEOUT = int(os.getenv("PG_TOOL_TIMEOUT", "600"))
+
+class DbToolError(Exception):
+    """pg_dump/pg_restore 실패."""
+
+class SqliteBackend:
+    name = "sqlite"
+    backup_ext = ".db"
+
+    def backup(self, dst, tenant=None):
+        _backup_sqlite(dst, (tenant or current_tenant()).sqlite_path)
+
+    def export(self, dst):
+        _backup_sqlite(dst)
+
+    def prepare_upload(self, path):
+        validate_sqlite_file(path)
+        apply_sqlite_migrations(path, rebuild_pending=True)
+
+    def install_upload(self, path):
+        swap_sqlite_file(path)
+
+class PostgresBackend:
+    name = "postgresql"
+    backup_ext = ".dump"   # pg_dump custom 형식(pg_restore 로 복원)
+
+    def _run(self, args):
+        url = make_url(database_url)
+        dsn = url.set(drivername="postgresql", password=None).render_as_string(hide_password=False)
+        env = dict(os.environ)
+        if url.password:
+            env["PGPASSWORD"] = url.password   # 명령줄(ps)에 비밀번호가 보이지 않게
+        try:
+            res = subprocess.run(args + ["--dbname", dsn], env=env, capture_output=True,
+                                 text=True, timeout=PG_TOOL_TIMEOUT)
+        except (OSError, subprocess.TimeoutExpired) as e:
+            raise DbToolError(f"{args[0]} 실행 실패: {e}")
+        if res.returncode != 0:
+            raise DbToolError(f"{args[0]} 실패: {res.stderr.strip()[:500]}")
+
+    def backup(self, dst, tenant=None):
+        self._run([PG_DUMP, "--format=custom", "--no-owner", "--no-privileges", "--file", dst])
+
+    def export(self, dst):
+        self.backup(dst)
+
+    def prepare_upload(self, path):
+        try:
+            res = subprocess.run([PG_RESTORE, "--list", path], capture_output=True, text=True,
+                                 timeout=PG_TOOL_TIMEOUT)
+        except (OSError, subprocess.TimeoutExpired) as e:
+            raise DbToolError(f"{PG_RESTORE} 실행 실패: {e}")
+        if res.returncode != 0:
+            raise UploadRejected("pg_dump(custom 형식) 파일이 아닙니다: " + res.stderr.strip()[:300])
+
+    def install_upload(self, path):
+        with db_gate.exclusive(DB_SWAP_DRAIN_SEC):
+            db.engine.dispose()
+            # --single-transaction: 실패하면 기존 데이터 그대로
+            self._run([PG_RESTORE, "--clean", "--if-exists", "--no-owner", "--no-privileges",
+                       "--single-transaction", path])
+            apply_migrations(db.engine, rebuild_pending=True)
+            db.engine.dispose()
+
+backend = PostgresBackend() if database_url.startswith("postgresql") else SqliteBackend()
+# ===========================
+
+# ====== 학년도 아카이브 ======
+# 마감된 학년도(3월~이듬해 2월)의 신청/답변을 연도별 SQLite 파일로 옮겨 라이브 DB를 작게 유지.
+# 아카이브 파일은 읽기 전용이며, 과거 범위를 조회할 때만 ATTACH 한다.
+ARCHIVE_DIR = os.getenv("ARCHIVE_DIR") or os.path.join(basedir, "archive")
+ARCHIVE_FILE_RE = re.compile(r"^consulting-(\d{4})\.db$")
+MAX_ATTACH = 9   # SQLite 기본 ATTACH 한도 10
+os.makedirs(ARCHIVE_DIR, exist_ok=True)
+
+def academic_year(dt):
+    """학년도(3월 시작). 1~2월은 전년도 학년도."""
+    return dt.year if dt.month >= 3 else dt.year - 1
+
+def _academic_year_of(s):
+    dt = parse_dt(s)
+    return academic_year(dt) if dt else None
+
+def _sqlite_uri(path, **params):
+    qs = "&".join(f"{k}={v}" for k, v in params.items())
+    return "file:" + pathname2url(os.path.abspath(path)) + (f"?{qs}" if qs else "")
+
+def archive_path(year):
+    return os.path.join(current_tenant().archive_dir, f"consulting-{int(year)}.db")
+
+def list_archive_years():
+    if backend.name != "sqlite":
+        return []
+    years = []
+    for f in os.listdir(current_tenant().archive_dir):
+        m = ARCHIVE_FILE_RE.match(f)
+        if m:
+            years.append(int(m.group(1)))
+    return sorted(years)
+
+def archive_candidate_years():
+    """라이브 DB에 남아 있는 마감 학년도 목록."""
+    cur_year = academic_year(datetime.now(KST))
+    years = set()
+    for (d,) in db.session.execute(db.select(ConsultRequest.date).distinct()):
+        y = _academic_year_of(d)
+        if y is not None and y < cur_year:
+            years.add(y)
+    return sorted(years)
+
+def archive_academic_year(year: int) -> dict:
+    """year 학년도 신청/답변을 아카이브 파일로 옮기고 라이브 DB에서 삭제."""
+    if not database_url.startswith("sqlite:///"):
+        raise RuntimeError("SQLite가 아닙니다.")
+    year = int(year)
+    if year >= academic_year(datetime.now(KST)):
+        raise ValueError(f"{year}학년도는 아직 마감되지 않았습니다.")
+    dst = archive_path(year)
+    if os.path.exists(dst):
+        raise ValueError(f"{year}학년도 아카이브가 이미 있습니다.")
+
+    make_backup_now()   # 옮기기 전 라이브 백업
+
+    tables = [ConsultRequest.__table__, ConsultLog.__table__]
+    eng = create_engine("sqlite:///" + dst.replace("\\", "/"))
+    db.metadata.create_all(eng, tables=tables)
+    eng.dispose()
+
+    req_cols = ", ".join(c.name for c in ConsultRequest.__table__.columns)
+    log_cols = ", ".join(c.name for c in ConsultLog.__table__.columns)
+    con = sqlite3.connect(current_tenant().sqlite_path, timeout=30, isolation_level=None)
+    try:
+        con.create_function("acad_year", 1, _academic_year_of, deterministic=True)
+        con.execute("ATTACH DATABASE ? AS arch", (dst,))
+        con.execute("BEGIN IMMEDIATE")
+        try:
+            con.execute("CREATE TEMP TABLE arch_ids AS "
+                        "SELECT id FROM main.consult_request WHERE acad_year(date) = ?", (year,))
+            n_req = con.execute(f"INSERT INTO arch.consult_request ({req_cols}) "
+                                f"SELECT {req_cols} FROM main.consult_request "
+                                "WHERE id IN (SELECT id FROM arch_ids)").rowcount
+            n_log = con.execute(f"INSERT INTO arch.consult_log ({log_cols}) "
+                                f"SELECT {log_cols} FROM main.consult_log "
+                                "WHERE request_id IN (SELECT id FROM arch_ids)").rowcount
+            if not n_req:
+                raise ValueError(f"{year}학년도 신청이 없습니다.")
+            con.execute("DELETE FROM main.pending_request WHERE request_id IN (SELECT id FROM arch_ids)")
+            con.execute("DELETE FROM main.consult_log WHERE request_id IN (SELECT id FROM arch_ids)")
+            con.execute("DELETE FROM main.consult_request WHERE id IN (SELECT id FROM arch_ids)")
+            con.execute("COMMIT")
+        except Exception:
+            con.execute("ROLLBACK")
+            raise
+    except Exception:
+        con.close()
+        if os.path.exists(dst):   # 커밋 전 실패: 라이브 DB 그대로이므로 아카이브 파일만 지운다
+            os.remove(dst)
+        raise
+    # 여기부터는 커밋됨 — 라이브 DB에서 지워졌으므로 dst 가 유일한 사본. 정리는 실패해도 무시.
+    try:
+        con.execute("DETACH DATABASE arch")
+        con.execute("VACUUM")   # 읽는 연결이 많으면 SQLITE_BUSY 로 실패할 수 있음
+    except Exception:
+        app.logger.exception(f"{year}학년도 아카이브 후 DETACH/VACUUM 실패 - 아카이브는 완료됨")
+    finally:
+        con.close()
+
+    os.chmod(dst, 0o444)
+    try:
+        current_engine().dispose()
+    except Exception:
+        pass
+    mark_data_changed()
+    reset_snapshot()   # 옮긴 학년도가 스냅샷에 남아 있으면 아카이브와 이중 집계
+    app.logger.info(f"{year}학년도 아카이브: 신청 {n_req}건, 답변 {n_log}건 -> {os.path.basename(dst)}")
+    return {"year": year, "requests": n_req, "logs": n_log, "file": os.path.basename(dst)}
+
+@contextmanager
+def open_history(years, snapshot=None):
+    """라이브 DB에 아카이브 연도 파일을 읽기 전용으로 ATTACH 한 sqlite3 연결.
+
+    (con, [schema, ...]) 를 돌려준다. 스키마 이름은 'y2024' 형식.
+    snapshot 을 주면 라이브 DB 대신 분석 스냅샷 파일을 main 으로 연다.
+    """
+    if not database_url.startswith("sqlite:///"):
+        raise RuntimeError("SQLite가 아닙니다.")
+    years = [int(y) for y in years if os.path.exists(archive_path(y))]
+    if len(years) > MAX_ATTACH:
+        raise ValueError(f"한 번에 {MAX_ATTACH}개 학년도까지만 조회할 수 있습니다.")
+    main = (_sqlite_uri(snapshot, mode="ro", immutable=1) if snapshot
+            else _sqlite_uri(current_tenant().sqlite_path, mode="ro"))
+    con = sqlite3.connect(main, uri=True)
+    try:
+        schemas = []
+        for y in years:
+            con.execute(f"ATTACH DATABASE ? AS y{y}", (_sqlite_uri(archive_path(y), mode="ro"),))
+            schemas.append(f"y{y}")
+        yield con, schemas
+    finally:
+        con.close()
+
+def _archive_row_streams(con, schema):
+    """compute_stats 용 (신청, 답변) 스트림 — 아카이브 스키마에서 읽음."""
+    req = con.execute("SELECT id, grade, class_num, number, name, topic, content, date "
+                      f"FROM {schema}.consult_request ORDER BY id")
+    logs = con.execute("SELECT request_id, teacher_name, date "
+                       f"FROM {schema}.consult_log ORDER BY request_id, id")
+    return req, logs
+
+@contextmanager
+def history_streams(years, snapshot=None):
+    """여러 아카이브 학년도의 compute_stats 스트림 목록.
+
+    연결 하나에 MAX_ATTACH 개까지만 붙일 수 있으므로 그보다 많으면 연결을 나눠 연다.
+    """
+    years = list(years)
+    with ExitStack() as stack:
+        sources = []
+        for i in range(0, len(years), MAX_ATTACH):
+            con, schemas = stack.enter_context(open_history(years[i:i + MAX_ATTACH], snapshot))
+            sources += [_archive_row_streams(con, sch) for sch in schemas]
+        yield sources
+
+def _archived_requests(year, grade, class_num):
+    """아카이브 학년도의 담임 반 신청 목록(읽기 전용)."""
+    with open_history([year]) as (con, schemas):
+        if not schemas:
+            return []
+        sch = schemas[0]
+        cur = con.execute(
+            "SELECT r.id, r.grade, r.class_num, r.number, r.name, r.topic, r.content, r.date, "
+            f"EXISTS(SELECT 1 FROM {sch}.consult_log l WHERE l.request_id = r.id) "
+            f"FROM {sch}.consult_request r WHERE r.grade = ? AND r.class_num = ? "
+            "ORDER BY r.date DESC", (grade, class_num))
+        return [SimpleNamespace(id=i, grade=g, class_num=c, number=n, name=nm, topic=t,
+                                content=ct, date=d, has_log=bool(h))
+                for i, g, c, n, nm, t, ct, d, h in cur]
+
+@app.route("/admin/archive", methods=["GET", "POST"])
+def admin_archive():
+    pw = request.values.get("pw")
+    if not admin_ok(pw):
+        return "Forbidden", 403
+    if backend.name != "sqlite":
+        return "ERR: 학년도 아카이브는 SQLite 에서만 지원합니다.", 400
+    if request.method == "POST":
+        try:
+            res = archive_academic_year(request.form.get("year", type=int))
+            return f"OK: {res['year']}학년도 신청 {res['requests']}건, 답변 {res['logs']}건 -> {res['file']}"
+        except (ValueError, TypeError) as e:
+            return f"ERR: {e}", 400
+        except Exception as e:
+            app.logger.exception("아카이브 실패")
+            return f"ERR: {e}", 500
+    done = ", ".join(f"{y}학년도" for y in list_archive_years()) or "없음"
+    options = "".join(f'<option value="{y}">{y}학년도</option>' for y in archive_candidate_years())
+    return f"""
+    <h3>학년도 아카이브</h3>
+    <p>보관됨: {done}</p>
+    <form method="post">
+      <input type="hidden" name="pw" value="{pw}">
+      <p>학년도: <select name="year">{options}</select></p>
+      <button {'disabled' if not options else ''}>아카이브</button>
+    </form>
+    """
+# ===========================
+
+# ====== 여러 학교(테넌트) ======
+# 한 배포에서 여러 학교를 운영. 학교마다 SQLite 파일·백업 폴더·아카이브 폴더·가입 코드가 따로 있다.
+# TENANT_MODE=path      → /s/<학교>/... 로 접속(이후 절대 링크는 쿠키로 학교 유지)
+# TENANT_MODE=subdomain → <학교>.TENANT_BASE_DOMAIN 으로 접속
+# 학교를 지정하지 않은 요청은 기존 DB(기본 학교)로 간다. 학교 목록은 TENANTS_FILE(JSON) 또는 TENANTS.
+TENANT_MODE = os.getenv('TENANT_MODE', '')                      # '' | path | subdomain
+TENANTS_FILE = os.getenv('TENANTS_FILE') or os.path.join(basedir, "tenants.json")
+TENANT_ROOT_DIR = os.getenv('TENANT_ROOT_DIR') or os.path.join(basedir, "tenants")
+TENANT_BASE_DOMAIN = os.getenv('TENANT_BASE_DOMAIN', '').lower().lstrip('.')
+TENANT_MAX_ENGINES = int(os.getenv('TENANT_MAX_ENGINES', '32'))  # 동시에 열어 두는 학교 DB 수
+TENANT_COOKIE = 'school'
+TENANT_SLUG_RE = re.compile(r"^[a-z0-9][a-z0-9-]{0,31}$")
+SIGNUP_CODE = os.getenv('SIGNUP_CODE', 'PAJU2025')
+
+class Tenant:
+    def __init__(self, slug, name=None, sqlite_path=None, backup_dir=None, archive_dir=None,
+                 signup_code=None, admin_pw=None, snapshot_path=None):
+        root = os.path.join(TENANT_ROOT_DIR, slug)
+        self.slug = slug
+        self.name = name or slug
+        self.sqlite_path = sqlite_path or os.path.join(root, "consulting.db")
+        self.snapshot_path = snapshot_path or os.path.join(os.path.dirname(self.sqlite_path),
+                                                           "analytics-snapshot.db")
+        self.backup_dir = backup_dir or os.path.join(root, "backups")
+        self.archive_dir = archive_dir or os.path.join(root, "archive")
+        self.state_path = os.path.join(self.backup_dir, ".state.json")
+        self.signup_code = signup_code or SIGNUP_CODE
+        self.admin_pw = admin_pw or ADMIN_PW
+
+    @property
+    def is_default(self):
+        return self.slug == ''
+
+    @property
+    def label(self):
+        return self.slug or "기본"
+
+DEFAULT_TENANT = Tenant('', sqlite_path=sqlite_path, backup_dir=BACKUP_DIR, archive_dir=ARCHIVE_DIR)
+
+def _load_tenants():
+    raw = os.getenv('TENANTS')
+    if not raw and os.path.exists(TENANTS_FILE):
+        with open(TENANTS_FILE, encoding="utf-8") as f:
+            raw = f.read()
+    conf = json.loads(raw) if raw else {}
+    tenants = {}
+    for slug, opts in conf.items():
+        if not TENANT_SLUG_RE.match(slug):
+            raise ValueError(f"학교 id 형식 오류: {slug!r}")
+        t = Tenant(slug, **(opts or {}))
+        for d in (os.path.dirname(t.sqlite_path), t.backup_dir, t.archive_dir):
+            os.makedirs(d, exist_ok=True)
+        tenants[slug] = t
+    return tenants
+
+if TENANT_MODE and backend.name != "sqlite":
+    app.logger.warning("여러 학교 모드는 SQLite 에서만 지원합니다 - TENANT_MODE 무시")
+    TENANT_MODE = ''
+TENANTS = _load_tenants() if TENANT_MODE else {}
+
+def all_tenants():
+    return [DEFAULT_TENANT, *TENANTS.values()]
+
+def current_tenant():
+    if has_app_context():
+        return g.get('tenant') or DEFAULT_TENANT
+    return DEFAULT_TENANT
+
+def admin_ok(pw):
+    return pw is not None and pw == current_tenant().admin_pw
+
+class TenantEngines:
+    """학교별 엔진 풀. 최대 max_engines 개까지 열어 두고, 넘치면 가장 오래 안 쓴(빌려 간 연결이 없는) 엔진을 닫는다.
+
+    open_engine(tenant) 가 새 엔진을 만든다.
+    """
+
+    def __init__(self, max_engines, open_engine):
+        self.max_engines = max_engines
+        self.open_engine = open_engine
+        self._engines = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, tenant):
+        with self._lock:
+            eng = self._engines.get(tenant.slug)
+            if eng is not None:
+                self._engines.move_to_end(tenant.slug)
+                return eng
+            eng = self.open_engine(tenant)
+            self._engines[tenant.slug] = eng
+            self._evict()
+            return eng
+
+    def _evict(self):
+        for slug in list(self._engines):
+            if len(self._engines) <= self.max_engines:
+                break
+            eng = self._engines[slug]
+            if eng.pool.checkedout() == 0:
+                del self._engines[slug]
+                eng.dispose()
+
+    def dispose(self, tenant):
+        with self._lock:
+            eng = self._engines.pop(tenant.slug, None)
+        if eng is not None:
+            eng.dispose()
+
+    def stats(self):
+        with self._lock:
+            return {"open": list(self._engines), "max": self.max_engines}
+
+_migrated_tenants = set()
+
+def _open_tenant_engine(tenant):
+    if tenant.slug not in _migrated_tenants:   # 처음 여는 학교 DB: 테이블/인덱스 준비
+        apply_sqlite_migrations(tenant.sqlite_path)
+        _migrated_tenants.add(tenant.slug)
+    return follow_file_swaps(create_engine("sqlite:///" + tenant.sqlite_path.replace("\\", "/")),
+                             tenant.sqlite_path)
+
+tenant_engines = TenantEngines(TENANT_MAX_ENGINES, _open_tenant_engine)
+
+def current_engine():
+    tenant = current_tenant()
+    return db.engine if tenant.is_default else tenant_engines.get(tenant)
+
+class TenantPathMiddleware:
+    """/s/<학교>/경로 → SCRIPT_NAME=/s/<학교>, PATH_INFO=/경로 (url_for 가 접두어를 붙여 줌)."""
+
+    def __init__(self, wsgi_app):
+        self.wsgi_app = wsgi_app
+
+    def __call__(self, environ, start_response):
+        split_tenant_path(environ)
+        return self.wsgi_app(environ, start_response)
+
+def split_tenant_path(environ):
+    parts = environ.get('PATH_INFO', '').split('/', 3)
+    if len(parts) >= 3 and parts[0] == '' and parts[1] == 's' and parts[2]:
+        environ['advice.tenant'] = parts[2]
+        environ['SCRIPT_NAME'] = environ.get('SCRIPT_NAME', '') + '/s/' + parts[2]
+        environ['PATH_INFO'] = '/' + (parts[3] if len(parts) > 3 else '')
+
+if TENANT_MODE == 'path':
+    app.wsgi_app = TenantPathMiddleware(app.wsgi_app)
+
+def _requested_tenant():
+    """요청의 학교. URL/호스트로 지정한 학교가 없으면 404, 쿠키의 학교가 없어졌으면 기본 학교."""
+    slug = ''
+    if TENANT_MODE == 'path':
+        slug = request.environ.get('advice.tenant')
+        if slug is None:
+            return TENANTS.get(request.cookies.get(TENANT_COOKIE, ''), DEFAULT_TENANT)
+    elif TENANT_MODE == 'subdomain' and TENANT_BASE_DOMAIN:
+        host = request.host.split(':', 1)[0].lower()
+        if host.endswith('.' + TENANT_BASE_DOMAIN):
+            slug = host[:-len(TENANT_BASE_DOMAIN) - 1]
+    if not slug:
+        return DEFAULT_TENANT
+    tenant = TENANTS.get(slug)
+    if tenant is None:
+        abort(404)
+    return tenant
+
+@app.before_request
+def _resolve_tenant():
+    if not TENANT_MODE:
+        return None
+    tenant = g.tenant = _requested_tenant()
+    # 다른 학교에서 만든 세션(로그인·조회 정보)은 쓰지 않는다
+    if session and session.get('_tenant') != tenant.slug:
+        session.clear()
+    return None
+
+@app.after_request
+def _remember_tenant(resp):
+    if not TENANT_MODE or 'tenant' not in g:
+        return resp
+    if session and session.get('_tenant') != g.tenant.slug:
+        session['_tenant'] = g.tenant.slug
+    if TENANT_MODE == 'path' and 'advice.tenant' in request.environ \
+            and request.cookies.get(TENANT_COOKIE) != g.tenant.slug:
+        resp.set_cookie(TENANT_COOKIE, g.tenant.slug, httponly=True, samesite='Lax')
+    return resp
+# ===========================
+
+# ====== 신청 그룹 커밋 ======
+# 상담 주간에는 신청이 한꺼번에 몰린다. 건마다 INSERT+commit(fsync)+상태파일 기록을 하면
+# SQLite 쓰기 잠금에서 줄을 서므로, 신청을 큐에 넣고 writer 스레드가 몇 ms 동안 모아
+# 한 트랜잭션으로 커밋한다. 응답은 해당 배치가 커밋된 뒤에 돌려준다.
+GROUP_COMMIT_ENABLED = os.getenv('GROUP_COMMIT_ENABLED', '1') == '1'
+GROUP_COMMIT_QUEUE_MAX = int(os.getenv('GROUP_COMMIT_QUEUE_MAX', '256'))
+GROUP_COMMIT_BATCH_MAX = int(os.getenv('GROUP_COMMIT_BATCH_MAX', '64'))
+GROUP_COMMIT_WINDOW_MS = float(os.getenv('GROUP_COMMIT_WINDOW_MS', '5'))
+GROUP_COMMIT_WAIT_SEC = float(os.getenv('GROUP_COMMIT_WAIT_SEC', '30'))
+BUSY_RETRY_AFTER_SEC = int(os.getenv('BUSY_RETRY_AFTER_SEC', '2'))
+
+class WriteQueueFull(Exception):
+    """그룹 커밋 큐가 가득 참(과부하)."""
+
+class _PendingWrite:
+    __slots__ = ('values', 'tenant', 'done', 'id', 'error', 'state', 'lock')
+
+    def __init__(self, values, tenant):
+        self.values = values
+        self.tenant = tenant
+        self.done = threading.Event()
+        self.id = None
+        self.error = None
+        self.state = 'queued'   # queued → claimed(writer 가 가져감) | cancelled(대기 시간 초과)
+        self.lock = threading.Lock()
+
+    def _move(self, state):
+        with self.lock:
+            if self.state == 'queued':
+                self.state = state
+            return self.state == state
+
+    def claim(self):
+        """writer 가 커밋하려고 가져감. 이미 취소됐으면 False."""
+        return self._move('claimed')
+
+    def cancel(self):
+        """아직 writer 가 가져가지 않았으면 취소(True). 이미 커밋 중이면 False."""
+        return self._move('cancelled')
+
+class GroupCommitWriter:
+    """ConsultRequest INSERT 를 모아서 커밋하는 단일 writer 스레드."""
+
+    def __init__(self, maxsize, batch_max, window_sec):
+        self.maxsize = maxsize
+        self.batch_max = batch_max
+        self.window_sec = window_sec
+        self._q = None
+        self._thread = None
+        self._pid = None
+        self._lock = threading.Lock()
+
+    def _ensure_started(self):
+        # gunicorn --preload 후 fork 된 워커에는 부모의 스레드가 없으므로 pid 기준으로 시작
+        if self._pid == os.getpid() and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._pid == os.getpid() and self._thread.is_alive():
+                return
+            self._q = queue.Queue(self.maxsize)
+            self._thread = threading.Thread(target=self._run, name="group-commit", daemon=True)
+            self._thread.start()
+            self._pid = os.getpid()
+
+    def submit(self, values: dict, timeout=None) -> int:
+        """신청 1건을 큐에 넣고 커밋될 때까지 기다린 뒤 새 id 반환."""
+        self._ensure_started()
+        item = _PendingWrite(values, current_tenant())
+        try:
+            self._q.put_nowait(item)
+        except queue.Full:
+            raise WriteQueueFull()
+        if not item.done.wait(timeout or GROUP_COMMIT_WAIT_SEC):
+            if item.cancel():   # 큐에서 빠지지 않았으면 커밋되지 않으므로 다시 시도해도 중복 없음
+                raise TimeoutError("그룹 커밋 대기 시간 초과")
+            item.done.wait()    # 이미 커밋 중: 결과를 기다린다(503 후 재시도하면 중복 신청)
+        if item.error is not None:
+            raise item.error
+        return item.id
+
+    def _run(self):
+        while True:
+            batch = [self._q.get()]
+            deadline = time.monotonic() + self.window_sec
+            while len(batch) < self.batch_max:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._q.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            batch = [it for it in batch if it.claim()]   # 대기 시간 초과로 취소된 건은 버린다
+            by_tenant = {}   # 학교마다 DB가 다르므로 학교별로 한 트랜잭션
+            for it in batch:
+                by_tenant.setdefault(it.tenant.slug, []).append(it)
+            for group in by_tenant.values():
+                try:
+                    with app.app_context():
+                        g.tenant = group[0].tenant
+                        self._commit(group)
+                except Exception as e:   # 앱 컨텍스트 자체 실패 등: 대기자를 풀어 준다
+                    app.logger.exception("그룹 커밋 실패")
+                    for it in group:
+                        if not it.done.is_set():
+                            it.error = e
+                            it.done.set()
+
+    def _commit(self, batch):
+        try:
+            objs = [ConsultRequest(**it.values) for it in batch]
+            db.session.add_all(objs)
+            db.session.flush()
+            for obj in objs:
+                pending_add(obj)
+            db.session.commit()
+            for it, obj in zip(batch, objs):
+                it.id = obj.id
+        except Exception:
+            # 배치 중 한 건이 문제면 나머지까지 실패하지 않도록 한 건씩 다시 시도
+            db.session.rollback()
+            app.logger.exception(f"그룹 커밋 실패({len(batch)}건) - 개별 커밋으로 재시도")
+            for it in batch:
+                try:
+                    obj = ConsultRequest(**it.values)
+                    db.session.add(obj)
+                    db.session.flush()
+                    pending_add(obj)
+                    db.session.commit()
+                    it.id = obj.id
+                except Exception as e:
+                    db.session.rollback()
+                    it.error = e
+        finally:
+            db.session.remove()
+        if any(it.id is not None for it in batch):
+            mark_data_changed()   # ← 백업 트리거(배치당 1회)
+        for it in batch:
+            it.done.set()
+
+submit_writer = GroupCommitWriter(GROUP_COMMIT_QUEUE_MAX, GROUP_COMMIT_BATCH_MAX,
+                                  GROUP_COMMIT_WINDOW_MS / 1000.0)
+
+def _busy_response(msg="신청이 몰려 잠시 처리할 수 없습니다. 잠시 후 다시 시도해 주세요."):
+    return f"<h3>{msg}</h3>", 503, {"Retry-After": str(BUSY_RETRY_AFTER_SEC)}
+# ===========================
+
+# ====== 보조 SQLite 파일 ======
+class LocalSqlite:
+    """consulting.db 와 분리된 보조 SQLite 파일(속도 제한·세션 등). 스레드/프로세스마다 연결 1개."""
+
+    def __init__(self, path, ddl):
+        self.path = path
+        self._local = threading.local()
+        con = self.con()
+        con.execute("PRAGMA journal_mode=WAL")
+        for stmt in ddl:
+            con.execute(stmt)
+
+    def con(self):
+        con = getattr(self._local, 'con', None)
+        if con is None or self._local.pid != os.getpid():
+            con = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            self._local.con, self._local.pid = con, os.getpid()
+        return con
+# ===========================
+
+# ====== 요청 속도 제한(토큰 버킷) ======
+# 공개/로그인/관리자 경로에 클라이언트 IP x 경로 분류별 토큰 버킷을 둔다.
+# 한도는 "버스트/초" 형식: '10/60' = 최대 10회 연속, 60초에 10개 보충.
+# 한 학교 학생·교사는 NAT 주소 하나를 함께 쓰므로 신청·조회·로그인은 IP + 대상(학년-반-번호, 신청 id,
+# 아이디)별로 세고, IP 전체에는 학급·교무실 단위 동시 사용을 막지 않을 만큼 넉넉한 상한(*_ip)만 둔다.
+# (신청 몰림은 그룹 커밋 큐가 503 으로 조절)
+# 워커가 여러 개면 RATE_LIMIT_STORE=sqlite 로 로컬 SQLite 파일에 상태를 공유한다.
+RATE_LIMIT_ENABLED = os.getenv('RATE_LIMIT_ENABLED', '1') == '1'
+RATE_LIMIT_STORE = os.getenv('RATE_LIMIT_STORE', 'memory')            # memory | sqlite
+RATE_LIMIT_DB = os.getenv('RATE_LIMIT_DB') or os.path.join(basedir, "ratelimit.db")
+RATE_LIMIT_PROXY_HOPS = int(os.getenv('RATE_LIMIT_PROXY_HOPS', '1'))  # 앞단 프록시 수(Render=1)
+RATE_LIMIT_MAX_KEYS = int(os.getenv('RATE_LIMIT_MAX_KEYS', '50000'))   # 버킷 수 상한(오래 안 쓴 것부터 버림)
+
+def _parse_rate(spec):
+    burst, per = spec.split('/')
+    burst, per = float(burst), float(per)
+    return burst, burst / per   # (용량, 초당 보충량)
+
+RATE_LIMITS = {
+    'submit': _parse_rate(os.getenv('RATE_LIMIT_SUBMIT', '10/60')),   # 상담 신청(IP x 학년-반-번호)
+    'submit_ip': _parse_rate(os.getenv('RATE_LIMIT_SUBMIT_IP', '600/60')),  # 상담 신청(IP 전체)
+    'lookup': _parse_rate(os.getenv('RATE_LIMIT_LOOKUP', '20/60')),   # 신청 조회/삭제(IP x 학번·신청, 비밀번호 대입 방지)
+    'lookup_ip': _parse_rate(os.getenv('RATE_LIMIT_LOOKUP_IP', '300/60')),  # 신청 조회/삭제(IP 전체)
+    'login': _parse_rate(os.getenv('RATE_LIMIT_LOGIN', '10/300')),    # 교사 로그인/가입(IP x 아이디)
+    'login_ip': _parse_rate(os.getenv('RATE_LIMIT_LOGIN_IP', '100/300')),  # 교사 로그인/가입(IP 전체)
+    'admin': _parse_rate(os.getenv('RATE_LIMIT_ADMIN', '30/60')),     # /admin/*
+}
+
+def _refill(tokens, ts, capacity, rate, now):
+    """버킷을 now 기준으로 보충하고 1개를 꺼낸다. (남은 토큰, 대기 초; 0이면 통과)."""
+    if tokens is None:
+        tokens = capacity
+    else:
+        tokens = min(capacity, tokens + (now - ts) * rate)
+    if tokens >= 1:
+        return tokens - 1, 0.0
+    return tokens, (1 - tokens) / rate
+
+class MemoryBucketStore:
+    """프로세스 내 버킷(단일 워커용). RATE_LIMIT_MAX_KEYS 를 넘으면 가장 오래 안 쓴 키부터 버린다(LRU)."""
+
+    def __init__(self, max_keys):
+        self.max_keys = max_keys
+        self._lock = threading.Lock()
+        self._buckets = OrderedDict()   # 오래 안 쓴 키가 앞
+
+    def take(self, key, capacity, rate):
+        now = time.monotonic()
+        with self._lock:
+            tokens, ts = self._buckets.pop(key, (None, now))
+            tokens, wait = _refill(tokens, ts, capacity, rate, now)
+            self._buckets[key] = (tokens, now)
+            while len(self._buckets) > self.max_keys:
+                self._buckets.popitem(last=False)
+        return wait
+
+class SqliteBucketStore:
+    """로컬 SQLite 파일에 버킷을 두어 여러 워커가 공유."""
+
+    def __init__(self, path):
+        self.db = LocalSqlite(path, [
+            "CREATE TABLE IF NOT EXISTS rate_bucket "
+            "(key TEXT PRIMARY KEY, tokens REAL NOT NULL, ts REAL NOT NULL)",
+            "CREATE INDEX IF NOT EXISTS ix_rate_bucket_ts ON rate_bucket (ts)",
+        ])
+
+    def take(self, key, capacity, rate):
+        now = time.time()
+        con = self.db.con()
+        con.execute("BEGIN IMMEDIATE")
+        try:
+            row = con.execute("SELECT tokens, ts FROM rate_bucket WHERE key = ?", (key,)).fetchone()
+            tokens, wait = _refill(row[0] if row else None, row[1] if row else now, capacity, rate, now)
+            con.execute("INSERT OR REPLACE INTO rate_bucket (key, tokens, ts) VALUES (?, ?, ?)",
+                        (key, tokens, now))
+            con.execute("COMMIT")
+        except Exception:
+            con.execute("ROLLBACK")
+            raise
+        return wait
+
+    def sweep(self, older_than_sec=3600, max_keys=RATE_LIMIT_MAX_KEYS):
+        con = self.db.con()
+        con.execute("DELETE FROM rate_bucket WHERE ts < ?", (time.time() - older_than_sec,))
+        # 한 시간 안에 키가 너무 많이 생겼으면(학번·아이디를 바꿔 가며 요청) 오래된 것부터 버린다
+        con.execute("DELETE FROM rate_bucket WHERE ts <= (SELECT ts FROM rate_bucket "
+                    "ORDER BY ts DESC LIMIT 1 OFFSET ?)", (max_keys,))
+
+if RATE_LIMIT_STORE == 'sqlite':
+    rate_store = SqliteBucketStore(RATE_LIMIT_DB)
+    scheduler.add_job(rate_store.sweep, "interval", minutes=10, id="rate_limit_sweep",
+                      max_instances=1, coalesce=True)
+else:
+    rate_store = MemoryBucketStore(RATE_LIMIT_MAX_KEYS)
+
+def client_ip():
+    # X-Forwarded-For 는 오른쪽이 가까운 프록시가 붙인 값. 신뢰하는 프록시 수만큼만 거슬러 올라간다.
+    fwd = [a.strip() for a in request.headers.get('X-Forwarded-For', '').split(',') if a.strip()]
+    if RATE_LIMIT_PROXY_HOPS and fwd:
+        return fwd[-min(RATE_LIMIT_PROXY_HOPS, len(fwd))]
+    return request.remote_addr or '-'
+
+def _rate_class():
+    ep = request.endpoint
+    if request.path.startswith('/admin/'):
+        return 'admin'
+    if request.method != 'POST':
+        return None
+    if ep == 'student_request':
+        return 'submit'
+    if ep in ('check_request', 'student_request_delete'):
+        return 'lookup'
+    if ep in ('teacher_login', 'teacher_signup'):
+        return 'login'
+    return None
+
+def _int_target(*fields):
+    """폼의 숫자 필드들을 'g-c-n' 키로. 숫자가 아니면 한 버킷('?')으로 모은다(키 수 폭증 방지)."""
+    vals = [(request.form.get(f) or '').strip() for f in fields]
+    return "-".join(vals) if all(v.isdigit() and len(v) <= 4 for v in vals) else "?"
+
+def _rate_target(cls):
+    """IP 와 함께 버킷 키가 되는 대상. None 이면 IP 만으로 센다."""
+    if cls == 'submit':
+        who = 'student' if request.form.get('applicant_type') == '학생' else 'parent'
+        return _int_target(f"grade_{who}", f"class_num_{who}", f"number_{who}")
+    if cls == 'lookup':
+        if request.endpoint == 'student_request_delete':
+            return f"req{request.view_args['req_id']}"
+        return _int_target('grade', 'class_num', 'number')
+    if cls == 'login':
+        return (request.form.get('username') or '').strip().lower()[:64] or "?"
+    return None
+
+def _rate_buckets(cls):
+    """요청이 토큰을 꺼낼 (분류, 키) 목록."""
+    ip = client_ip()
+    target = _rate_target(cls)
+    if target is None:
+        return [(cls, f"{cls}:{ip}")]
+    return [(cls, f"{cls}:{ip}:{target}"), (f"{cls}_ip", f"{cls}_ip:{ip}")]
+
+@app.before_request
+def _rate_limit():
+    if not RATE_LIMIT_ENABLED:
+        return None
+    cls = _rate_class()
+    if cls is None:
+        return None
+    try:
+        wait = 0.0
+        for bucket, key in _rate_buckets(cls):
+            capacity, rate = RATE_LIMITS[bucket]
+            wait = max(wait, rate_store.take(key, capacity, rate))
+    except Exception:
+        app.logger.exception("속도 제한 저장소 오류 - 통과시킴")
+        return None
+    if wait > 0:
+        return ("<h3>요청이 너무 많습니다. 잠시 후 다시 시도해 주세요.</h3>", 429,
+                {"Retry-After": str(max(1, ceil(wait)))})
+    return None
+# ===========================
+
+# ====== 서버 측 세션 ======
+# 쿠키에는 서명된 불투명 id 만 두고, 세션 내용(학생 조회 정보·교사 스코프 등)은 서버 SQLite에 둔다.
+# SESSION_STORE=cookie 면 Flask 기본(서명 쿠키) 세션을 그대로 쓴다.
+SESSION_STORE = os.getenv('SESSION_STORE', 'sqlite')                 # sqlite | cookie
+SESSION_DB = os.getenv('SESSION_DB') or os.path.join(basedir, "sessions.db")
+SESSION_IDLE_SEC = int(os.getenv('SESSION_IDLE_SEC', str(12 * 3600)))  # 미사용 만료
+
+class ServerSession(CallbackDict, SessionMixin):
+    def __init__(self, initial=None, sid=None, new=False, expires=0.0):
+        def on_update(d):
+            d.modified = True
+        super().__init__(initial, on_update)
+        self.sid = sid
+        self.new = new
+        self.expires = expires
+        self.old_sid = None
+        self.modified = False
+
+    def regenerate(self):
+        """로그인 등 권한이 바뀔 때 세션 id 교체(세션 고정 방지)."""
+        if not self.new and self.old_sid is None:
+            self.old_sid = self.sid
+        self.sid = secrets.token_urlsafe(32)
+        self.modified = True
+
+class SqliteSessionInterface(SessionInterface):
+    serializer = TaggedJSONSerializer()
+
+    def __init__(self, path, idle_sec):
+        self.idle_sec = idle_sec
+        self.db = LocalSqlite(path, [
+            "CREATE TABLE IF NOT EXISTS web_session "
+            "(sid TEXT PRIMARY KEY, data TEXT NOT NULL, expires REAL NOT NULL)",
+            "CREATE INDEX IF NOT EXISTS ix_web_session_expires ON web_session (expires)",
+        ])
+
+    def _signer(self, app):
+        return Signer(app.secret_key, salt="server-session")
+
+    def open_session(self, app, request):
+        if not app.secret_key:
+            return None
+        raw = request.cookies.get(self.get_cookie_name(app))
+        if raw:
+            try:
+                sid = self._signer(app).unsign(raw).decode()
+            except BadSignature:
+                sid = None
+            if sid:
+                row = self.db.con().execute(
+                    "SELECT data, expires FROM web_session WHERE sid = ? AND expires > ?",
+                    (sid, time.time())).fetchone()
+                if row:
+                    return ServerSession(self.serializer.loads(row[0]), sid=sid, expires=row[1])
+        return ServerSession(sid=secrets.token_urlsafe(32), new=True)
+
+    def save_session(self, app, session, response):
+        name = self.get_cookie_name(app)
+        domain = self.get_cookie_domain(app)
+        path = self.get_cookie_path(app)
+        con = self.db.con()
+        if session.old_sid:
+            con.execute("DELETE FROM web_session WHERE sid = ?", (session.old_sid,))
+        if not session:
+            if not session.new:
+                con.execute("DELETE FROM web_session WHERE sid = ?", (session.sid,))
+            if session.modified or session.old_sid:
+                response.delete_cookie(name, domain=domain, path=path,
+                                       secure=self.get_cookie_secure(app),
+                                       samesite=self.get_cookie_samesite(app))
+            return
+        response.vary.add("Cookie")
+        now = time.time()
+        # 내용이 바뀌었거나 만료까지 절반 이하로 남았을 때만 기록(매 요청 쓰기 방지)
+        if session.modified or session.expires - now < self.idle_sec / 2:
+            con.execute("INSERT OR REPLACE INTO web_session (sid, data, expires) VALUES (?, ?, ?)",
+                        (session.sid, self.serializer.dumps(dict(session)), now + self.idle_sec))
+        if session.modified or session.new or session.old_sid or self.should_set_cookie(app, session):
+            response.set_cookie(
+                name, self._signer(app).sign(session.sid).decode(),
+                expires=self.get_expiration_time(app, session),
+                httponly=self.get_cookie_httponly(app), domain=domain, path=path,
+                secure=self.get_cookie_secure(app), samesite=self.get_cookie_samesite(app))
+
+    def sweep(self):
+        self.db.con().execute("DELETE FROM web_session WHERE expires < ?", (time.time(),))
+
+if SESSION_STORE == 'sqlite':
+    app.session_interface = SqliteSessionInterface(SESSION_DB, SESSION_IDLE_SEC)
+    scheduler.add_job(app.session_interface.sweep, "interval", minutes=10, id="session_sweep",
+                      max_instances=1, coalesce=True)
+
+def regenerate_session():
+    if isinstance(session, ServerSession):
+        session.regenerate()
+# ===========================
+
+# ====== DB 교체 게이트 ======
+# /admin/upload_db 로 DB 파일을 바꿀 때 진행 중인 요청을 비우고(drain) 새 요청은 잠시 대기시킨다.
+DB_SWAP_DRAIN_SEC = float(os.getenv('DB_SWAP_DRAIN_SEC', '30'))
+DB_GATE_EXEMPT = {'static', 'healthz', 'admin_upload_db'}
+
+class DbGate:
+    def __init__(self):
+        self._cond = threading.Condition()
+        self._active = 0
+        self._closed = False
+
+    def enter(self, timeout):
+        with self._cond:
+            if not self._cond.wait_for(lambda: not self._closed, timeout):
+                return False
+            self._active += 1
+            return True
+
+    def leave(self):
+        with self._cond:
+            self._active -= 1
+            self._cond.notify_all()
+
+    @contextmanager
+    def exclusive(self, timeout):
+        """진행 중인 요청이 모두 끝날 때까지 기다린 뒤, 블록 동안 새 요청을 막는다."""
+        with self._cond:
+            if self._closed:
+                raise RuntimeError("이미 DB 교체가 진행 중입니다.")
+            self._closed = True
+            if not self._cond.wait_for(lambda: self._active == 0, timeout):
+                self._closed = False
+                self._cond.notify_all()
+                raise TimeoutError("진행 중인 요청이 끝나지 않았습니다.")
+        try:
+            yield
+        finally:
+            with self._cond:
+                self._closed = False
+                self._cond.notify_all()
+
+db_gate = DbGate()
+
+@app.before_request
+def _enter_db_gate():
+    if request.endpoint in DB_GATE_EXEMPT:
+        return None
+    if not db_gate.enter(DB_SWAP_DRAIN_SEC):
+        return _busy_response("DB 교체 중입니다. 잠시 후 다시 시도해 주세요.")
+    g.db_gate_entered = True
+
+@app.teardown_request
+def _leave_db_gate(exc):
+    if g.pop('db_gate_entered', False):
+        db_gate.leave()
+# ===========================
+
 # 헬스체크
 @app.route('/healthz')
 def healthz():
     return {'ok': True, 'time_kst': now_kst_str()}, 200
 
 # DB 점검
+def _masked_db_url():
+    return make_url(database_url).render_as_string(hide_password=True)
+
 @app.get("/dbcheck")
 def dbcheck():
     try:
         cnt = db.session.execute(text("SELECT COUNT(*) AS c FROM consult_request")).scalar()
-        return {"ok": True, "db": database_url, "rows": cnt}, 200
+        return {"ok": True, "db": _masked_db_url(), "rows": cnt}, 200
     except Exception as e:
-        return {"ok": False, "db": database_url, "error": str(e)}, 500
+        return {"ok": False, "db": _masked_db_url(), "error": str(e)}, 500
 
 @app.get("/admin/storage_status")
 def storage_status():
     seed = os.path.join(basedir, "seed", "consulting-seed.db")
-    live = sqlite_path  # advice6/consulting.db
-    return {
+    live = current_tenant().sqlite_path  # advice6/consulting.db (학교별 DB면 tenants/<학교>/)
+    out = {
         "seed_exists": os.path.exists(seed),
         "live_exists": os.path.exists(live),
         "seed_path": seed,
         "live_path": live,
     }
+    if admin_ok(request.args.get("pw")):   # 다른 학교 목록 등은 관리자에게만
+        out.update(backend=backend.name, tenant=current_tenant().slug,
+                   tenant_engines=tenant_engines.stats())
+    return out
+
+# DB 업로드(교체): 스트리밍 저장 → 검증 → 마이그레이션 → 원자적 교체
+MAX_DB_UPLOAD_MB = int(os.getenv('MAX_DB_UPLOAD_MB', '200'))
+# 요청 본문 상한(업로드가 가장 큼). Content-Length 없는 chunked 본문도 읽는 도중 413 으로 끊기고,
+# 멀티파트 파싱이 임시 파일에 쌓는 양도 이만큼으로 제한된다. 64KB 는 멀티파트 헤더·암호 필드 몫.
+app.config['MAX_CONTENT_LENGTH'] = MAX_DB_UPLOAD_MB * 1024 * 1024 + 64 * 1024
+SQLITE_HEADER = b"SQLite format 3\x00"
+
+class UploadRejected(Exception):
+    def __init__(self, msg, status=400):
+        super().__init__(msg)
+        self.status = status
+
+def _stream_to_file(src, dst_path, limit):
+    size = 0
+    with open(dst_path, "wb") as out:
+        while True:
+            chunk = src.read(1024 * 1024)
+            if not chunk:
+                break
+            size += len(chunk)
+            if size > limit:
+                raise UploadRejected(f"파일이 너무 큽니다(최대 {MAX_DB_UPLOAD_MB}MB).", 413)
+            out.write(chunk)
+        out.flush()
+        os.fsync(out.fileno())
+    return size
+
+def validate_sqlite_file(path):
+    """무결성 검사 + 필수 테이블/컬럼 확인. 문제 있으면 UploadRejected."""
+    with open(path, "rb") as f:
+        if f.read(len(SQLITE_HEADER)) != SQLITE_HEADER:
+            raise UploadRejected("SQLite 파일이 아닙니다.")
+    con = sqlite3.connect(_sqlite_uri(path, mode="ro"), uri=True)
+    try:
+        res = [r[0] for r in con.execute("PRAGMA integrity_check")]
+        if res != ["ok"]:
+            raise UploadRejected("무결성 검사 실패: " + "; ".join(res[:5]))
+        for tbl in (ConsultRequest.__table__, ConsultLog.__table__, Teacher.__table__):
+            cols = {r[1] for r in con.execute(f"PRAGMA table_info({tbl.name})")}
+            if not cols:
+                raise UploadRejected(f"테이블 없음: {tbl.name}")
+            missing = [c.name for c in tbl.columns if c.name not in cols]
+            if missing:
+                raise UploadRejected(f"{tbl.name} 컬럼 없음: {', '.join(missing)}")
+    except sqlite3.DatabaseError as e:
+        raise UploadRejected(f"DB를 열 수 없습니다: {e}")
+    finally:
+        con.close()
+
+def swap_sqlite_file(new_path):
+    """검증된 new_path 로 라이브 DB를 원자적으로 교체(요청 drain → 풀 정리 → os.replace)."""
+    live = current_tenant().sqlite_path
+    with db_gate.exclusive(DB_SWAP_DRAIN_SEC):
+        current_engine().dispose()
+        # 이전 파일의 WAL/저널이 새 파일에 적용되면 안 됨
+        for ext in ("-wal", "-shm", "-journal"):
+            try:
+                os.remove(live + ext)
+            except FileNotFoundError:
+                pass
+        os.replace(new_path, live)
+        current_engine().dispose()
+    reset_snapshot()
 
-# DB 업로드(교체) : 기존 유지
 @app.route("/admin/upload_db", methods=["GET","POST"])
 def admin_upload_db():
     if request.method == "GET":
         return """
         <form method="post" enctype="multipart/form-data">
           <p>암호: <input name="pw" type="password"></p>
-          <p>.db 파일: <input name="file" type="file" accept=".db"></p>
+          <p>{ext} 파일: <input name="file" type="file" accept="{ext}"></p>
           <button>업로드</button>
         </form>
-        """
-    if request.form.get("pw") != ADMIN_PW:
+        """.format(ext=backend.backup_ext)
+    limit = MAX_DB_UPLOAD_MB * 1024 * 1024
+    if request.content_length and request.content_length > limit + 64 * 1024:
+        return f"too large (max {MAX_DB_UPLOAD_MB}MB)", 413
+    # application/octet-stream 본문(curl --data-binary)은 멀티파트 파싱 없이 바로 스트리밍
+    raw = request.mimetype == "application/octet-stream"
+    # 암호가 쿼리에 있으면 본문을 읽기 전에 확인(멀티파트 폼은 파싱해야 암호 필드가 보인다)
+    pw = request.args.get("pw") or (None if raw else request.form.get("pw"))
+    if not admin_ok(pw):
         return "Forbidden", 403
-    f = request.files.get("file")
-    if not f: 
+    src = request.stream if raw else getattr(request.files.get("file"), "stream", None)
+    if src is None:
         return "no file", 400
-    tmp = os.path.join(basedir, "tmp-upload-"+secure_filename(f.filename))
-    f.save(tmp)
-    # 교체 전 라이브 백업
-    try:
-        make_backup_now()
-    except Exception:
-        pass
-    shutil.copyfile(tmp, sqlite_path)
+
+    # SQLite 는 os.replace 가 원자적이도록 같은 디렉터리에 임시 파일을 둔다
+    tmp_dir = os.path.dirname(current_tenant().sqlite_path) if backend.name == "sqlite" else None
+    fd, tmp = tempfile.mkstemp(prefix=".upload-", suffix=backend.backup_ext, dir=tmp_dir)
+    os.close(fd)
     try:
-        db.engine.dispose()
-    except Exception:
-        pass
+        _stream_to_file(src, tmp, limit)
+        backend.prepare_upload(tmp)
+        # 교체 전 라이브 백업
+        try:
+            make_backup_now()
+        except Exception:
+            app.logger.exception("교체 전 백업 실패")
+        backend.install_upload(tmp)
+    except UploadRejected as e:
+        return f"ERR: {e}", e.status
+    except DbToolError as e:
+        app.logger.exception("DB 복원 실패")
+        return f"ERR: {e}", 500
+    except (TimeoutError, RuntimeError) as e:
+        return f"ERR: {e}", 503, {"Retry-After": str(BUSY_RETRY_AFTER_SEC)}
+    finally:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+    mark_data_changed()
     return "OK - DB replaced"
 
 # 추가: 현재 DB 다운로드 / 백업 목록 / 백업 파일 다운로드 / 즉시 백업
+BACKUP_EXTS = (".db", ".dump")
+
+def live_db_download():
+    """SQLite 라이브 DB (경로, 내려받을 파일 이름)."""
+    tenant = current_tenant()
+    return tenant.sqlite_path, (f"consulting-{tenant.slug}.db" if tenant.slug else "consulting.db")
+
+def backup_file_path(fname):
+    """백업 파일 경로. 허용하지 않는 이름이면 None."""
+    if not fname.endswith(BACKUP_EXTS) or "/" in fname or ".." in fname:
+        return None
+    return os.path.join(current_tenant().backup_dir, fname)
+
 @app.get("/admin/download_db")
 def admin_download_db():
-    if request.args.get("pw") != ADMIN_PW:
+    if not admin_ok(request.args.get("pw")):
         return "Forbidden", 403
-    if not os.path.exists(sqlite_path):
-        return "DB not found", 404
-    return send_file(sqlite_path, as_attachment=True, download_name="consulting.db")
+    if backend.name == "sqlite":
+        path, name = live_db_download()
+        if not os.path.exists(path):
+            return "DB not found", 404
+        return send_file(path, as_attachment=True, download_name=name)
+    # Postgres: 논리 백업(pg_dump)을 임시 파일로 만들어 내려보내고 응답이 끝나면 삭제
+    fd, tmp = tempfile.mkstemp(prefix="export-", suffix=backend.backup_ext)
+    os.close(fd)
+    try:
+        backend.export(tmp)
+    except DbToolError as e:
+        os.remove(tmp)
+        return f"ERR: {e}", 500
+    resp = send_file(tmp, as_attachment=True, download_name="consulting" + backend.backup_ext)
+    resp.call_on_close(lambda: os.path.exists(tmp) and os.remove(tmp))
+    return resp
 
 @app.get("/admin/backups")
 def list_backups():
-    if request.args.get("pw") != ADMIN_PW:
+    pw = request.args.get("pw")
+    if not admin_ok(pw):
         return "Forbidden", 403
-    files = sorted([f for f in os.listdir(BACKUP_DIR) if f.endswith(".db")])
-    links = "<br>".join(f'<a href="/admin/backup/{f}?pw={ADMIN_PW}">{f}</a>' for f in files)
+    files = sorted([f for f in os.listdir(current_tenant().backup_dir) if f.endswith(BACKUP_EXTS)])
+    links = "<br>".join(f'<a href="{request.script_root}/admin/backup/{f}?pw={pw}">{f}</a>' for f in files)
     return f"<h3>백업 목록</h3>{links or '없음'}"
 
 @app.get("/admin/backup/<path:fname>")
 def download_backup_file(fname):
-    if request.args.get("pw") != ADMIN_PW:
+    if not admin_ok(request.args.get("pw")):
         return "Forbidden", 403
-    if not fname.endswith(".db") or "/" in fname or ".." in fname:
+    if backup_file_path(fname) is None:
         return "Bad name", 400
-    return send_from_directory(BACKUP_DIR, fname, as_attachment=True, download_name=fname)
+    return send_from_directory(current_tenant().backup_dir, fname, as_attachment=True, download_name=fname)
 
 @app.get("/admin/backup_now")
 def backup_now():
-    if request.args.get("pw") != ADMIN_PW:
+    if not admin_ok(request.args.get("pw")):
         return "Forbidden", 403
     try:
         out = make_backup_now()
@@ -283,7 +1550,7 @@ def student_request():
         if topic == '기타':
             topic = (request.form.get('custom_topic') or '').strip() or '기타'
 
-        new_request = ConsultRequest(
+        values = dict(
             grade=grade,
             class_num=class_num,
             number=number,
@@ -294,9 +1561,20 @@ def student_request():
             content=content,
             date=now_kst_str()
         )
-        db.session.add(new_request)
-        db.session.commit()
-        mark_data_changed()   # ← 백업 트리거
+        if GROUP_COMMIT_ENABLED:
+            try:
+                new_id = submit_writer.submit(values)
+            except (WriteQueueFull, TimeoutError):
+                return _busy_response()
+        else:
+            new_request = ConsultRequest(**values)
+            db.session.add(new_request)
+            db.session.flush()
+            pending_add(new_request)
+            db.session.commit()
+            new_id = new_request.id
+            mark_data_changed()   # ← 백업 트리거
+        _remember_my_request(values, new_id)
         return render_template('student_complete.html')
 
     return render_template('student_request.html')
@@ -329,9 +1607,12 @@ def student_request_delete(req_id):
         return redirect(url_for('check_request'))
 
     ConsultLog.query.filter_by(request_id=req_id).delete()
+    pending_remove(req_id)
     db.session.delete(r)
     db.session.commit()
     mark_data_changed()   # ← 백업 트리거
+    if session.get('myreq_ids'):
+        session['myreq_ids'] = [i for i in session['myreq_ids'] if i != req_id]
     flash('삭제되었습니다.')
 
     if session.get('myreq_ctx'):
@@ -339,6 +1620,73 @@ def student_request_delete(req_id):
     return redirect(url_for('check_request'))
 
 # === 내가 신청한 내역 보기 ===
+# 조회한 학생 신원으로 찾은 신청 id 목록을 세션에 캐시해 두고, 새로고침 때는 PK로만 읽는다.
+MYREQ_IDS_TTL_SEC = int(os.getenv('MYREQ_IDS_TTL_SEC', '300'))
+
+def _myreq_identity(ctx):
+    return (ctx['grade'], ctx['class_num'], ctx['number'], ctx['name'], ctx['password'])
+
+def _myreq_identity_query(ctx):
+    return (db.select(ConsultRequest)
+            .filter_by(grade=ctx['grade'], class_num=ctx['class_num'], number=ctx['number'],
+                       name=ctx['name'], password=ctx['password'])
+            .order_by(ConsultRequest.id))
+
+def my_requests_query(ctx):
+    """(쿼리, 신원 조회 여부). 세션의 id 목록이 유효하면 PK 조회, 아니면 신원(5개 컬럼) 조회."""
+    ids = session.get('myreq_ids')
+    if ids is None or time.time() - session.get('myreq_ids_ts', 0) > MYREQ_IDS_TTL_SEC:
+        return _myreq_identity_query(ctx), True
+    return db.select(ConsultRequest).where(ConsultRequest.id.in_(ids)).order_by(ConsultRequest.id), False
+
+def finish_my_requests(ctx, rows, resolved):
+    """my_requests_query 결과 정리: 신원 조회였으면 id 목록을 세션에 캐시, 아니면 신원 재확인."""
+    if resolved:
+        session['myreq_ids'] = [r.id for r in rows]
+        session['myreq_ids_ts'] = time.time()
+        return rows
+    # 삭제 후 id 가 재사용됐을 수 있으므로 신원을 한 번 더 확인
+    ident = _myreq_identity(ctx)
+    return [r for r in rows if (r.grade, r.class_num, r.number, r.name, r.password) == ident]
+
+def _resolve_my_requests(ctx):
+    """신원(5개 컬럼)으로 신청을 찾고 id 목록을 세션에 캐시."""
+    return finish_my_requests(ctx, db.session.scalars(_myreq_identity_query(ctx)).all(), True)
+
+def _load_my_requests(ctx):
+    query, resolved = my_requests_query(ctx)
+    return finish_my_requests(ctx, db.session.scalars(query).all(), resolved)
+
+def _remember_my_request(values, new_id):
+    """같은 브라우저에서 새로 신청하면 캐시된 id 목록에도 추가."""
+    ctx = session.get('myreq_ctx')
+    if not ctx or new_id is None or session.get('myreq_ids') is None:
+        return
+    if (values['grade'], values['class_num'], values['number'], values['name'], values['password']) == _myreq_identity(ctx):
+        session['myreq_ids'] = session['myreq_ids'] + [new_id]
+
+def my_request_logs_query(matched):
+    return (db.select(ConsultLog).where(ConsultLog.request_id.in_([r.id for r in matched]))
+            .order_by(ConsultLog.id))
+
+def my_request_rows(matched, log_rows=None):
+    """my_requests.html 행. log_rows 를 주지 않으면 답변을 한 번의 IN 쿼리로 가져온다."""
+    if log_rows is None:
+        log_rows = db.session.scalars(my_request_logs_query(matched)) if matched else []
+    logs = {}
+    for lg in log_rows:
+        logs.setdefault(lg.request_id, lg)
+    data = []
+    for r in matched:
+        log = logs.get(r.id)
+        status = '✅ 확인됨' if log else '🟡 대기 중'
+        answer = log.memo if log else ''
+        data.append({
+            'id': r.id, 'date': r.date, 'topic': r.topic,
+            'content': r.content, 'status': status, 'answer': answer
+        })
+    return data
+
 @app.route('/check_request', methods=['GET', 'POST'])
 def check_request():
     if request.method == 'POST':
@@ -348,26 +1696,14 @@ def check_request():
         name = request.form['name']
         pw = request.form['password']
 
+        regenerate_session()
         session['myreq_ctx'] = {
             'grade': grade, 'class_num': class_num, 'number': number,
             'name': name, 'password': pw
         }
 
-        matched = ConsultRequest.query.filter_by(
-            grade=grade, class_num=class_num, number=number,
-            name=name, password=pw
-        ).all()
-
-        data = []
-        for r in matched:
-            log = ConsultLog.query.filter_by(request_id=r.id).first()
-            status = '✅ 확인됨' if log else '🟡 대기 중'
-            answer = log.memo if log else ''
-            data.append({
-                'id': r.id, 'date': r.date, 'topic': r.topic,
-                'content': r.content, 'status': status, 'answer': answer
-            })
-        return render_template('my_requests.html', data=data, name=name)
+        matched = _resolve_my_requests(session['myreq_ctx'])
+        return render_template('my_requests.html', data=my_request_rows(matched), name=name)
 
     return render_template('check_request.html')
 
@@ -377,21 +1713,8 @@ def my_requests():
     if not ctx:
         return redirect(url_for('check_request'))
 
-    matched = ConsultRequest.query.filter_by(
-        grade=ctx['grade'], class_num=ctx['class_num'], number=ctx['number'],
-        name=ctx['name'], password=ctx['password']
-    ).all()
-
-    data = []
-    for r in matched:
-        log = ConsultLog.query.filter_by(request_id=r.id).first()
-        status = '✅ 확인됨' if log else '🟡 대기 중'
-        answer = log.memo if log else ''
-        data.append({
-            'id': r.id, 'date': r.date, 'topic': r.topic,
-            'content': r.content, 'status': status, 'answer': answer
-        })
-    return render_template('my_requests.html', data=data, name=ctx['name'])
+    matched = _load_my_requests(ctx)
+    return render_template('my_requests.html', data=my_request_rows(matched), name=ctx['name'])
 
 # === 교사 인증/홈 ===
 @app.route('/teacher_signup', methods=['GET', 'POST'])
@@ -404,7 +1727,7 @@ def teacher_signup():
         class_num = int(request.form['class_num'])
         signup_code = request.form['signup_code']
 
-        if signup_code != 'PAJU2025':
+        if signup_code != current_tenant().signup_code:
             return "올바른 가입 코드가 아닙니다."
         if password != confirm:
             return "비밀번호가 일치하지 않습니다."
@@ -429,6 +1752,7 @@ def teacher_login():
         if teacher:
             if not teacher.is_approved:
                 return render_template("teacher_login.html", message="⛔ 승인되지 않은 계정입니다.")
+            regenerate_session()
             session['teacher_id'] = teacher.id
             session['teacher_username'] = teacher.username
             session['grade'] = teacher.grade
@@ -442,18 +1766,43 @@ def teacher_login():
 def teacher_home():
     if 'teacher_id' not in session:
         return redirect('/teacher_login')
-    return render_template('teacher_home.html', username=session['teacher_username'])
+    pending = pending_summary(session['grade'], session['class_num'])
+    return render_template('teacher_home.html', username=session['teacher_username'], pending=pending)
 
 # === 담임용 목록(반 필터 + 스코프 전달) ===
 # === consult_list (드릴다운 필터 지원) :: 기존 함수 교체 ===
+def consult_list_query(grade, class_num):
+    """담임 반 신청과 답변 여부를 한 번에 조회. 행은 (ConsultRequest, has_log)."""
+    has_log = db.exists().where(ConsultLog.request_id == ConsultRequest.id)
+    return (db.select(ConsultRequest, has_log)
+            .where(ConsultRequest.grade == grade, ConsultRequest.class_num == class_num)
+            .order_by(ConsultRequest.date.desc()))
+
+def consult_list_scope():
+    """(grade, class_num, archive_year, archive_years). archive_year 는 보관 학년도 조회일 때만."""
+    archive_years = list_archive_years()
+    archive_year = request.args.get('year', type=int)
+    if archive_year not in archive_years:
+        archive_year = None
+    return session['grade'], session['class_num'], archive_year, archive_years
+
+def archived_consult_rows(year, grade, class_num):
+    return [(r, r.has_log) for r in _archived_requests(year, grade, class_num)]
+
 @app.route('/consult_list')
 def consult_list():
     if 'teacher_id' not in session:
         return redirect('/teacher_login')
 
-    grade = session['grade']
-    class_num = session['class_num']
+    grade, class_num, archive_year, archive_years = consult_list_scope()
+    if archive_year:   # 과거 학년도(아카이브) 조회: 읽기 전용
+        all_rows = archived_consult_rows(archive_year, grade, class_num)
+    else:
+        all_rows = db.session.execute(consult_list_query(grade, class_num)).all()
+    return render_consult_list(all_rows, grade, class_num, archive_year, archive_years)
 
+def render_consult_list(all_rows, grade, class_num, archive_year, archive_years):
+    """(신청, 답변 여부) 목록을 요청 파라미터로 필터·페이지 나눔 후 렌더(ASGI 핸들러와 공용)."""
     page = int(request.args.get('page', 1))
     per_page = int(request.args.get('per_page', 8))
 
@@ -467,12 +1816,6 @@ def consult_list():
         # 종료일시 포함되도록 +1분
         f_to = f_to + timedelta(minutes=1)
 
-    # 담임 스코프
-    base_q = (ConsultRequest.query
-              .filter_by(grade=grade, class_num=class_num)
-              .order_by(ConsultRequest.date.desc()))
-    all_rows = base_q.all()
-
     # 🧲 파라미터 기반 2차 필터링(파이썬 레벨: 날짜가 문자열이어서 안전하게 처리)
     def _ok(r):
         if f_number and r.number != f_number:
@@ -491,11 +1834,10 @@ def consult_list():
                 return False
         return True
 
-    filtered = [r for r in all_rows if _ok(r)]
-
     rows = []
-    for r in filtered:
-        log = ConsultLog.query.filter_by(request_id=r.id).first()
+    for r, log in all_rows:
+        if not _ok(r):
+            continue
         checked = '✅' if log else '🟡'
         btn_label = '수정' if log else '작성'
         is_parent = (r.content or '').strip().startswith('[관계:')
@@ -527,9 +1869,11 @@ def consult_list():
         page=page,
         page_count=page_count,
         per_page=per_page,
-        edit_date_enabled=EDIT_DATE_ENABLED,
+        edit_date_enabled=EDIT_DATE_ENABLED and not archive_year,
         filter_grade=grade,
         filter_class=class_num,
+        archive_year=archive_year,
+        archive_years=archive_years,
     )
 
 # === 상담일지 작성/수정 ===
@@ -566,6 +1910,7 @@ def write_log(req_id):
                 memo=memo,
                 date=new_date_str or now_kst_str()
             ))
+            pending_remove(req_id)
         db.session.commit()
         mark_data_changed()   # ← 백업 트리거
         return redirect(url_for('consult_list', page=back_page))
@@ -582,104 +1927,223 @@ def write_log(req_id):
         back_page=back_page,
     )
 
-# === 통계 ===
-@app.route('/statistics')
-def statistics():
-    if 'teacher_id' not in session:
-        return redirect('/teacher_login')
-
-    requests = ConsultRequest.query.all()
-    logs = ConsultLog.query.all()
-
-    log_by_req_id = {}
-    for lg in logs:
-        cur = log_by_req_id.get(lg.request_id)
-        if not cur:
-            log_by_req_id[lg.request_id] = lg
+# === 통계 집계(스트리밍, 1-pass) ===
+STATS_YIELD_PER = int(os.getenv('STATS_YIELD_PER', '500'))
+RECENT_UNANSWERED_N = 10
+
+class _P2Quantile:
+    """P² 알고리즘(Jain & Chlamtac, 1985) 스트리밍 분위수 추정.
+
+    표본이 적을 때는 정확한 값을 쓰려고 EXACT_LIMIT 개까지는 정렬 버퍼에 담고,
+    넘치면 버퍼에서 5개 마커를 잡아 P² 로 전환한다(메모리 상한 고정).
+    """
+    EXACT_LIMIT = 128
+    __slots__ = ('p', 'n', 'buf', 'q', 'pos', 'want', 'dn')
+
+    def __init__(self, p):
+        self.p = p
+        self.n = 0
+        self.buf = []          # 정확 모드 정렬 버퍼
+        self.q = None          # 마커 높이
+        self.pos = None        # 마커 위치(1-based 순위)
+        self.want = None       # 마커 목표 위치
+        self.dn = [0, p / 2, p, (1 + p) / 2, 1]
+
+    def _start_markers(self):
+        buf, n = self.buf, self.n
+        self.want = [1 + (n - 1) * f for f in self.dn]
+        self.pos = [int(round(w)) for w in self.want]
+        self.q = [buf[i - 1] for i in self.pos]
+        self.buf = None
+
+    def add(self, x):
+        self.n += 1
+        if self.buf is not None:
+            bisect.insort(self.buf, x)
+            if self.n > self.EXACT_LIMIT:
+                self._start_markers()
+            return
+        q, pos = self.q, self.pos
+        if x < q[0]:
+            q[0] = x
+            k = 0
+        elif x >= q[4]:
+            q[4] = x
+            k = 3
         else:
-            cur_dt = parse_dt(cur.date)
-            lg_dt = parse_dt(lg.date)
-            if cur_dt and lg_dt and lg_dt < cur_dt:
-                log_by_req_id[lg.request_id] = lg
+            k = 0
+            while x >= q[k + 1]:
+                k += 1
+        for i in range(k + 1, 5):
+            pos[i] += 1
+        for i in range(5):
+            self.want[i] += self.dn[i]
+        for i in (1, 2, 3):
+            d = self.want[i] - pos[i]
+            if (d >= 1 and pos[i + 1] - pos[i] > 1) or (d <= -1 and pos[i - 1] - pos[i] < -1):
+                d = 1 if d > 0 else -1
+                qn = q[i] + d / (pos[i + 1] - pos[i - 1]) * (
+                    (pos[i] - pos[i - 1] + d) * (q[i + 1] - q[i]) / (pos[i + 1] - pos[i])
+                    + (pos[i + 1] - pos[i] - d) * (q[i] - q[i - 1]) / (pos[i] - pos[i - 1]))
+                if not (q[i - 1] < qn < q[i + 1]):
+                    qn = q[i] + d * (q[i + d] - q[i]) / (pos[i + d] - pos[i])
+                q[i] = qn
+                pos[i] += d
+
+    def value(self):
+        if not self.n:
+            return None
+        if self.buf is not None:
+            return self.buf[max(0, ceil(self.p * self.n) - 1)]   # nearest-rank
+        return self.q[2]
+
+class _ResponseSketch:
+    """응답 소요시간(시간 단위) 요약: 건수 / 평균 / 중앙값 / p90."""
+    __slots__ = ('count', 'total', 'p50', 'p90')
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.p50 = _P2Quantile(0.5)
+        self.p90 = _P2Quantile(0.9)
+
+    def add(self, hours):
+        self.count += 1
+        self.total += hours
+        self.p50.add(hours)
+        self.p90.add(hours)
+
+    def summary(self):
+        if not self.count:
+            return {"count": 0, "avg": None, "median": None, "p90": None}
+        return {
+            "count": self.count,
+            "avg": round(self.total / self.count, 2),
+            "median": round(self.p50.value(), 2),
+            "p90": round(self.p90.value(), 2),
+        }
 
-    now = datetime.now(KST)
+def _iter_chunks(rows, size):
+    it = iter(rows)
+    while True:
+        chunk = list(islice(it, size))
+        if not chunk:
+            return
+        yield chunk
+
+def compute_stats(sources, now=None, recent_n=RECENT_UNANSWERED_N):
+    """신청/답변 행 스트림을 한 번만 훑어 통계 dict를 만든다.
+
+    sources: [(req_rows, log_rows), ...] — DB(라이브/아카이브)마다 한 쌍
+      req_rows: (id, grade, class_num, number, name, topic, content, date) — id 오름차순
+      log_rows: (request_id, teacher_name, date) — request_id 오름차순
+    DB마다 두 스트림을 머지 조인하므로 전체 행을 메모리에 올리지 않는다.
+    recent_n: 최근 미답변 목록 크기(0이면 계산하지 않음 — 라이브 DB는 대기열에서 읽는다).
+    """
+    now = now or datetime.now(KST)
+    today = now.date()
     d7 = now - timedelta(days=7)
     d30 = now - timedelta(days=30)
 
-    total = len(requests)
-    handled = 0
-    pending = 0
-    by_topic = {}
-    by_grade = {}
-    by_grade_class = {}
-    recent_unanswered = []
+    total = handled = pending = 0
+    today_cnt = week_cnt = month_cnt = 0
+    parent_cnt = student_cnt = 0
+    by_topic, by_grade, by_grade_class = {}, {}, {}
     teacher_activity_30d = {}
-    parent_cnt = 0
-    student_cnt = 0
-    response_hours = []
-
-    for r in requests:
-        content = (r.content or "").strip()
-        if content.startswith('[관계:'):
-            parent_cnt += 1
-        else:
-            student_cnt += 1
-
-        by_topic[r.topic] = by_topic.get(r.topic, 0) + 1
-        by_grade[r.grade] = by_grade.get(r.grade, 0) + 1
-        key_gc = (r.grade, r.class_num)
-        by_grade_class[key_gc] = by_grade_class.get(key_gc, 0) + 1
-
-        req_dt = parse_dt(r.date)
-        lg = log_by_req_id.get(r.id)
-
-        if lg:
-            handled += 1
-            lg_dt = parse_dt(lg.date)
-            if req_dt and lg_dt and lg_dt >= req_dt:
-                response_hours.append((lg_dt - req_dt).total_seconds() / 3600.0)
-        else:
-            pending += 1
-            recent_unanswered.append({
-                "id": r.id,
-                "date": r.date,
-                "grade": r.grade,
-                "class_num": r.class_num,
-                "number": r.number,
-                "name": r.name,
-                "topic": r.topic,
-            })
-
-    for lg in logs:
-        lg_dt = parse_dt(lg.date)
-        if lg_dt and lg_dt >= d30:
-            teacher_activity_30d[lg.teacher_name] = teacher_activity_30d.get(lg.teacher_name, 0) + 1
-
-    today = now.date()
-    today_cnt = sum(1 for r in requests if (parse_dt(r.date) or now).date() == today)
-    week_cnt = sum(1 for r in requests if (parse_dt(r.date) or now) >= d7)
-    month_cnt = sum(1 for r in requests if (parse_dt(r.date) or now) >= d30)
+    response = _ResponseSketch()
+    response_by_grade, response_by_topic = {}, {}
+    unanswered_heap = []   # (eff_dt, -seq, item) 최신 N건만 유지
+
+    logs = iter(())
+    pending_log = None
+
+    def take_logs_until(rid):
+        """request_id <= rid 인 답변을 소비하고, rid 의 가장 이른 답변 시각을 반환."""
+        nonlocal pending_log
+        first = None
+        found = False
+        while pending_log is not None and (rid is None or pending_log[0] <= rid):
+            lg_req_id, teacher_name, lg_date = pending_log
+            lg_dt = parse_dt(lg_date)
+            if lg_dt and lg_dt >= d30:
+                teacher_activity_30d[teacher_name] = teacher_activity_30d.get(teacher_name, 0) + 1
+            if lg_req_id == rid:
+                if not found:
+                    first, found = lg_dt, True
+                elif first and lg_dt and lg_dt < first:
+                    first = lg_dt
+            pending_log = next(logs, None)
+        return found, first
+
+    seq = 0
+    for req_rows, log_rows in sources:
+        logs = iter(log_rows)
+        pending_log = next(logs, None)
+        for chunk in _iter_chunks(req_rows, STATS_YIELD_PER):
+            req_dts = parse_dt_many([row[7] for row in chunk])
+            for (rid, grade, class_num, number, name, topic, content, date), req_dt in zip(chunk, req_dts):
+                seq += 1
+                total += 1
+                if (content or "").strip().startswith('[관계:'):
+                    parent_cnt += 1
+                else:
+                    student_cnt += 1
+
+                by_topic[topic] = by_topic.get(topic, 0) + 1
+                by_grade[grade] = by_grade.get(grade, 0) + 1
+                key_gc = (grade, class_num)
+                by_grade_class[key_gc] = by_grade_class.get(key_gc, 0) + 1
+
+                eff_dt = req_dt or now
+                if eff_dt.date() == today:
+                    today_cnt += 1
+                if eff_dt >= d7:
+                    week_cnt += 1
+                if eff_dt >= d30:
+                    month_cnt += 1
+
+                has_log, lg_dt = take_logs_until(rid)
+                if has_log:
+                    handled += 1
+                    if req_dt and lg_dt and lg_dt >= req_dt:
+                        hours = (lg_dt - req_dt).total_seconds() / 3600.0
+                        response.add(hours)
+                        response_by_grade.setdefault(grade, _ResponseSketch()).add(hours)
+                        response_by_topic.setdefault(topic, _ResponseSketch()).add(hours)
+                else:
+                    pending += 1
+                    if not recent_n:
+                        continue
+                    item = (eff_dt, -seq, {
+                        "id": rid,
+                        "date": date,
+                        "grade": grade,
+                        "class_num": class_num,
+                        "number": number,
+                        "name": name,
+                        "topic": topic,
+                    })
+                    if len(unanswered_heap) < recent_n:
+                        heapq.heappush(unanswered_heap, item)
+                    elif item[:2] > unanswered_heap[0][:2]:
+                        heapq.heapreplace(unanswered_heap, item)
+
+        take_logs_until(None)   # 신청이 없는(고아) 답변도 교사 활동에는 포함
 
     top_topics = sorted(by_topic.items(), key=lambda kv: kv[1], reverse=True)[:5]
-    top_teachers_30d = sorted(teacher_activity_30d.items(), key=lambda kv: kv[1], reverse=True)[:5]
-
-    recent_unanswered.sort(key=lambda x: (parse_dt(x["date"]) or now), reverse=True)
-    recent_unanswered = recent_unanswered[:10]
-
-    avg_response_h = round(sum(response_hours)/len(response_hours), 2) if response_hours else None
-    handled_rate = round(handled / total * 100, 2) if total else 0.0
-    parent_ratio = round(parent_cnt / total * 100, 2) if total else 0.0
-    student_ratio = round(student_cnt / total * 100, 2) if total else 0.0
+    teacher_sorted = sorted(teacher_activity_30d.items(), key=lambda kv: kv[1], reverse=True)
+    recent_unanswered = [it[2] for it in sorted(unanswered_heap, key=lambda it: it[:2], reverse=True)]
 
     by_grade_class_pretty = {}
     for (g, c), n in by_grade_class.items():
         by_grade_class_pretty.setdefault(g, {})[c] = n
 
-    stats = {
+    resp = response.summary()
+    return {
         "total": total,
         "handled": handled,
         "pending": pending,
-        "handled_rate": handled_rate,
+        "handled_rate": round(handled / total * 100, 2) if total else 0.0,
         "today": today_cnt,
         "last7d": week_cnt,
         "last30d": month_cnt,
@@ -688,18 +2152,201 @@ def statistics():
         "by_grade": by_grade,
         "by_grade_class": by_grade_class_pretty,
         "recent_unanswered": recent_unanswered,
-        "teacher_activity_30d": dict(sorted(teacher_activity_30d.items(), key=lambda kv: kv[1], reverse=True)),
-        "top_teachers_30d": top_teachers_30d,
+        "teacher_activity_30d": dict(teacher_sorted),
+        "top_teachers_30d": teacher_sorted[:5],
         "applicant": {
             "student": student_cnt,
             "parent": parent_cnt,
-            "student_ratio": student_ratio,
-            "parent_ratio": parent_ratio,
+            "student_ratio": round(student_cnt / total * 100, 2) if total else 0.0,
+            "parent_ratio": round(parent_cnt / total * 100, 2) if total else 0.0,
         },
-        "avg_response_hours": avg_response_h,
+        "avg_response_hours": resp["avg"],
+        "median_response_hours": resp["median"],
+        "p90_response_hours": resp["p90"],
+        "response_by_grade": {g: sk.summary() for g, sk in sorted(response_by_grade.items())},
+        "response_by_topic": {t: sk.summary() for t, sk in
+                              sorted(response_by_topic.items(), key=lambda kv: kv[1].count, reverse=True)},
     }
+
+# ====== 분석 스냅샷 ======
+# 통계는 전체 테이블을 훑으므로 신청/답변 쓰기와 같은 파일을 읽지 않도록,
+# 라이브 DB를 주기적으로 복사(SQLite backup API)한 읽기 전용 스냅샷에서 집계한다.
+# 스냅샷은 mode=ro&immutable=1 로 열어 잠금도 변경 감지도 하지 않는다(교체는 새 파일 + os.replace).
+ANALYTICS_SNAPSHOT = os.getenv('ANALYTICS_SNAPSHOT', '0') == '1'
+ANALYTICS_MAX_STALE_SEC = int(os.getenv('ANALYTICS_MAX_STALE_SEC', '300'))  # 이보다 오래되면 조회 시 갱신
+ANALYTICS_REFRESH_SEC = int(os.getenv('ANALYTICS_REFRESH_SEC', '60'))       # 백그라운드 갱신 주기
+
+if ANALYTICS_SNAPSHOT and backend.name != "sqlite":
+    app.logger.warning("분석 스냅샷은 SQLite 에서만 지원합니다 - ANALYTICS_SNAPSHOT 무시")
+    ANALYTICS_SNAPSHOT = False
+
+def _open_snapshot_engine(tenant):
+    path = pathname2url(os.path.abspath(tenant.snapshot_path))
+    # 다른 워커가 스냅샷을 다시 만들면(새 inode) 이전 스냅샷 연결을 버린다
+    return follow_file_swaps(create_engine(f"sqlite:///file:{path}?mode=ro&immutable=1&uri=true"),
+                             tenant.snapshot_path)
+
+analytics_engines = TenantEngines(TENANT_MAX_ENGINES, _open_snapshot_engine)
+_snapshot_locks = {}
+_snapshot_locks_guard = threading.Lock()
+
+def snapshot_as_of(tenant):
+    """스냅샷 기준 시각(epoch). 파일 mtime 을 복사 시작 시각으로 맞춰 둔다. 없으면 None."""
+    try:
+        return os.path.getmtime(tenant.snapshot_path)
+    except OSError:
+        return None
+
+def refresh_snapshot(tenant=None) -> float:
+    tenant = tenant or current_tenant()
+    started = time.time()
+    fd, tmp = tempfile.mkstemp(prefix=".snapshot-", suffix=".db",
+                               dir=os.path.dirname(tenant.snapshot_path))
+    os.close(fd)
+    try:
+        _backup_sqlite(tmp, tenant.sqlite_path)
+        con = sqlite3.connect(tmp)
+        con.execute("PRAGMA journal_mode=DELETE")   # WAL 헤더면 immutable 로 열 수 없음
+        con.close()
+        os.utime(tmp, (started, started))
+        os.replace(tmp, tenant.snapshot_path)
+    except Exception:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        raise
+    analytics_engines.dispose(tenant)   # 새 연결은 새 파일을 연다(사용 중인 연결은 이전 파일 그대로)
+    return started
+
+def _snapshot_changed_since(tenant, as_of):
+    return _load_state(tenant).get("last_change_ts", float("inf")) >= as_of
+
+def _snapshot_lock(tenant):
+    with _snapshot_locks_guard:
+        return _snapshot_locks.setdefault(tenant.slug, threading.Lock())
+
+def fresh_snapshot(tenant=None) -> float:
+    """ANALYTICS_MAX_STALE_SEC 안의 스냅샷을 보장하고 기준 시각을 돌려준다."""
+    tenant = tenant or current_tenant()
+    as_of = snapshot_as_of(tenant)
+    if as_of is not None and time.time() - as_of <= ANALYTICS_MAX_STALE_SEC:
+        return as_of
+    with _snapshot_lock(tenant):   # 같은 학교 스냅샷은 한 번만 복사
+        as_of = snapshot_as_of(tenant)
+        if as_of is not None and time.time() - as_of <= ANALYTICS_MAX_STALE_SEC:
+            return as_of
+        if as_of is not None and not _snapshot_changed_since(tenant, as_of):
+            now = time.time()   # 그 뒤로 바뀐 데이터가 없으면 복사 없이 기준 시각만 갱신
+            os.utime(tenant.snapshot_path, (now, now))
+            return now
+        return refresh_snapshot(tenant)
+
+def reset_snapshot(tenant=None):
+    """라이브 DB 구성이 바뀐 뒤(학년도 아카이브·DB 교체) 스냅샷을 바로 다시 만든다.
+
+    이전 스냅샷을 그대로 두면 아카이브로 옮긴 학년도가 스냅샷과 아카이브 파일에 모두 있어
+    전체 범위 통계가 두 번 센다. 다시 만들지 못하면 지워서 다음 조회가 새로 복사하게 한다.
+    """
+    tenant = tenant or current_tenant()
+    if snapshot_as_of(tenant) is None:
+        return
+    with _snapshot_lock(tenant):
+        try:
+            refresh_snapshot(tenant)
+        except Exception:
+            app.logger.exception(f"분석 스냅샷 재생성 실패({tenant.label}) - 삭제")
+            try:
+                os.remove(tenant.snapshot_path)
+            except FileNotFoundError:
+                pass
+            analytics_engines.dispose(tenant)
+
+def _analytics_refresh_job():
+    # 이미 스냅샷을 쓰는 학교만, 데이터가 바뀌었을 때 미리 갱신(조회 요청이 복사를 기다리지 않게)
+    for tenant in all_tenants():
+        as_of = snapshot_as_of(tenant)
+        if as_of is not None and _snapshot_changed_since(tenant, as_of):
+            try:
+                with _snapshot_lock(tenant):   # 아카이브 직후 재생성을 이전 복사본이 덮어쓰지 않게
+                    refresh_snapshot(tenant)
+            except Exception:
+                app.logger.exception(f"분석 스냅샷 갱신 실패({tenant.label})")
+
+if ANALYTICS_SNAPSHOT:
+    scheduler.add_job(_analytics_refresh_job, "interval", seconds=ANALYTICS_REFRESH_SEC,
+                      id="analytics_refresh", max_instances=1, coalesce=True)
+
+@contextmanager
+def analytics_session():
+    """통계용 (세션, 기준 시각). 스냅샷 모드가 아니면 (db.session, None)."""
+    if not ANALYTICS_SNAPSHOT:
+        yield db.session, None
+        return
+    tenant = current_tenant()
+    as_of = fresh_snapshot(tenant)
+    sess = SaSession(bind=analytics_engines.get(tenant))
+    try:
+        yield sess, as_of
+    finally:
+        sess.close()
+# ===========================
+
+def live_stats(sess):
+    """라이브(또는 스냅샷) DB 통계 + 최근 미답변 목록."""
+    stats = compute_stats([_stats_row_streams(sess)], recent_n=0)
+    stats["recent_unanswered"] = recent_pending(RECENT_UNANSWERED_N, sess)
+    return stats
+
+def format_as_of(as_of):
+    return datetime.fromtimestamp(as_of, KST).strftime('%Y-%m-%d %H:%M:%S') if as_of else None
+
+def stats_for_scope(scope=''):
+    """scope: ''(라이브) | 'all'(라이브+아카이브 전체) | 'YYYY'(해당 학년도 아카이브).
+
+    라이브 데이터는 analytics_session() 에서 읽는다. stats["as_of"] 는 스냅샷 기준 시각(라이브면 None).
+    """
+    if scope.isdigit() and int(scope) in list_archive_years():
+        with open_history([int(scope)]) as (con, schemas):
+            stats = compute_stats([_archive_row_streams(con, sch) for sch in schemas])
+        stats["as_of"] = None
+        return stats
+    with analytics_session() as (sess, as_of):
+        if scope == 'all':
+            years = list_archive_years()   # Postgres 는 아카이브가 없으므로 항상 []
+            if years:
+                snapshot = current_tenant().snapshot_path if as_of else None
+                with history_streams(years, snapshot) as sources:
+                    stats = compute_stats([_stats_row_streams(sess), *sources])
+            else:
+                stats = compute_stats([_stats_row_streams(sess)])
+        else:
+            stats = live_stats(sess)
+    stats["as_of"] = format_as_of(as_of)
+    return stats
+
+def _stats_row_streams(sess=None):
+    """서버 측 커서(yield_per)로 신청/답변을 id 순으로 흘려보내는 두 스트림."""
+    req_q = (db.select(ConsultRequest.id, ConsultRequest.grade, ConsultRequest.class_num,
+                       ConsultRequest.number, ConsultRequest.name, ConsultRequest.topic,
+                       ConsultRequest.content, ConsultRequest.date)
+             .order_by(ConsultRequest.id)
+             .execution_options(yield_per=STATS_YIELD_PER))
+    log_q = (db.select(ConsultLog.request_id, ConsultLog.teacher_name, ConsultLog.date)
+             .order_by(ConsultLog.request_id, ConsultLog.id)
+             .execution_options(yield_per=STATS_YIELD_PER))
+    sess = sess or db.session
+    return sess.execute(req_q), sess.execute(log_q)
+
+# === 통계 ===
+@app.route('/statistics')
+def statistics():
+    if 'teacher_id' not in session:
+        return redirect('/teacher_login')
+
+    scope = (request.args.get('year') or '').strip()
+    stats = stats_for_scope(scope)
     return render_template('statistics.html', stats=stats,
-                           topic_count=by_topic, grade_count=by_grade)
+                           topic_count=stats["by_topic"], grade_count=stats["by_grade"],
+                           scope=scope, archive_years=list_archive_years())
 
 # JSON 통계
 @app.get('/api/stats')
@@ -707,61 +2354,59 @@ def api_stats():
     if 'teacher_id' not in session:
         return jsonify({"ok": False, "error": "login required"}), 401
 
-    requests = ConsultRequest.query.all()
-    logs = ConsultLog.query.all()
-
-    log_by_req_id = {}
-    for lg in logs:
-        log_by_req_id.setdefault(lg.request_id, lg)
-
-    now = datetime.now(KST)
-    d7 = now - timedelta(days=7)
-    d30 = now - timedelta(days=30)
+    stats = stats_for_scope((request.args.get('year') or '').strip())
+    return jsonify(stats_payload(stats))
 
-    total = len(requests)
-    handled = sum(1 for r in requests if r.id in log_by_req_id)
-    pending = total - handled
-    today_cnt = sum(1 for r in requests if (parse_dt(r.date) or now).date() == now.date())
-    week_cnt = sum(1 for r in requests if (parse_dt(r.date) or now) >= d7)
-    month_cnt = sum(1 for r in requests if (parse_dt(r.date) or now) >= d30)
-
-    by_topic, by_grade = {}, {}
-    parent_cnt = 0
-    student_cnt = 0
-    response_hours = []
-
-    for r in requests:
-        by_topic[r.topic] = by_topic.get(r.topic, 0) + 1
-        by_grade[r.grade] = by_grade.get(r.grade, 0) + 1
-        if r.content.strip().startswith('[관계:'):
-            parent_cnt += 1
-        else:
-            student_cnt += 1
-
-        lg = log_by_req_id.get(r.id)
-        if lg:
-            rd = parse_dt(r.date)
-            ld = parse_dt(lg.date)
-            if rd and ld and ld >= rd:
-                response_hours.append((ld - rd).total_seconds() / 3600.0)
+def stats_payload(stats):
+    """/api/stats 응답 본문."""
+    return {
+        "ok": True,
+        "total": stats["total"],
+        "handled": stats["handled"],
+        "pending": stats["pending"],
+        "handled_rate": stats["handled_rate"],
+        "today": stats["today"],
+        "last7d": stats["last7d"],
+        "last30d": stats["last30d"],
+        "by_topic": stats["by_topic"],
+        "by_grade": stats["by_grade"],
+        "applicant": {"student": stats["applicant"]["student"], "parent": stats["applicant"]["parent"]},
+        "avg_response_hours": stats["avg_response_hours"],
+        "median_response_hours": stats["median_response_hours"],
+        "p90_response_hours": stats["p90_response_hours"],
+        "response_by_grade": stats["response_by_grade"],
+        "response_by_topic": stats["response_by_topic"],
+        "as_of": stats["as_of"],
+    }
 
-    avg_response_h = round(sum(response_hours)/len(response_hours), 2) if response_hours else None
-    handled_rate = round(handled / total * 100, 2) if total else 0.0
+# 응답 압축(HTML/JSON, 임계값 이상만)
+COMPRESS_ENABLED = os.getenv('COMPRESS_ENABLED', '1') == '1'
+COMPRESS_MIN_BYTES = int(os.getenv('COMPRESS_MIN_BYTES', '1024'))
+COMPRESS_MIMETYPES = {'text/html', 'application/json'}
 
-    return jsonify({
-        "ok": True,
-        "total": total,
-        "handled": handled,
-        "pending": pending,
-        "handled_rate": handled_rate,
-        "today": today_cnt,
-        "last7d": week_cnt,
-        "last30d": month_cnt,
-        "by_topic": by_topic,
-        "by_grade": by_grade,
-        "applicant": {"student": student_cnt, "parent": parent_cnt},
-        "avg_response_hours": avg_response_h,
-    })
+@app.after_request
+def compress_response(resp):
+    if (not COMPRESS_ENABLED or resp.direct_passthrough or resp.is_streamed
+            or resp.status_code < 200 or resp.status_code in (204, 304)
+            or resp.mimetype not in COMPRESS_MIMETYPES or 'Content-Encoding' in resp.headers):
+        return resp
+    resp.vary.add('Accept-Encoding')
+    accept = request.accept_encodings
+    if brotli is not None and accept['br']:
+        enc = 'br'
+    elif accept['gzip']:
+        enc = 'gzip'
+    else:
+        return resp
+    data = resp.get_data()
+    if len(data) < COMPRESS_MIN_BYTES:
+        return resp
+    if enc == 'br':
+        resp.set_data(brotli.compress(data, quality=5))
+    else:
+        resp.set_data(gzip.compress(data, compresslevel=6, mtime=0))
+    resp.headers['Content-Encoding'] = enc
+    return resp
 
 # 통계 페이지/API는 항상 신선하게(브라우저·중간 프록시 캐시 무효화)
 @app.after_request
@@ -873,11 +2518,39 @@ def update_consult_date():
             dt = datetime.now(KST)
 
     rec.date = dt.strftime('%Y-%m-%d %H:%M')
+    PendingRequest.query.filter_by(request_id=rec.id).update({'date': rec.date})
     db.session.commit()
     mark_data_changed()   # ← 백업 트리거
     flash('상담 신청일을 수정했습니다.')
     return redirect(url_for('consult_list', page=back_page))
 
+# 템플릿 미리 컴파일: 부팅 시(및 `flask precompile-templates`) 모든 템플릿을 컴파일해
+# 바이트코드 캐시에 채워 둔다. --preload 면 포크된 워커도 컴파일된 템플릿을 물려받는다.
+PRECOMPILE_TEMPLATES = os.getenv('PRECOMPILE_TEMPLATES', '1') == '1'
+
+def precompile_templates():
+    """컴파일된 템플릿 이름 목록과 실패 목록 [(이름, 오류)] 반환. 한 개가 깨져도 나머지는 계속."""
+    done, failed = [], []
+    for name in app.jinja_env.list_templates(extensions=["html"]):
+        try:
+            app.jinja_env.get_template(name)
+            done.append(name)
+        except Exception as e:
+            failed.append((name, e))
+    return done, failed
+
+@app.cli.command("precompile-templates")
+def precompile_templates_command():
+    """모든 템플릿을 바이트코드 캐시로 컴파일."""
+    done, failed = precompile_templates()
+    print(f"{len(done)}개 템플릿 컴파일 -> {TEMPLATE_CACHE_DIR}")
+    for name, e in failed:
+        print(f"[실패] {name}: {e}")
+
+if PRECOMPILE_TEMPLATES:
+    for name, e in precompile_templates()[1]:
+        app.logger.warning(f"템플릿 미리 컴파일 실패: {name}: {e}")
+
 # 500 핸들러
 @app.errorhandler(500)
 def handle_500(e):
@@ -0,0 +1,307 @@
+# asgi.py  ── ASGI 진입점(선택)
+#   uvicorn asgi:app --host 0.0.0.0 --port $PORT
+#
+# wsgi.py 와 같은 Flask 앱을 그대로 서비스한다. 읽기 위주 화면(consult_list, my_requests,
+# /api/stats)과 파일 다운로드(/admin/download_db, /admin/backup/<파일>)만 async 핸들러로
+# 처리하고, 나머지 경로는 스레드 풀에서 기존 WSGI 앱으로 넘긴다(a2wsgi).
+# 느린 다운로드·오래 걸리는 조회가 스레드를 붙잡지 않으므로 동시 연결을 훨씬 많이 받는다.
+#
+# 필요 패키지: uvicorn, a2wsgi, aiosqlite (requirements.txt)
+# Postgres 이거나 aiosqlite 가 없으면 모든 경로를 WSGI 로 처리한다.
+import os, io, sys, asyncio, mimetypes
+from importlib import import_module
+from collections import OrderedDict
+from urllib.request import pathname2url
+
+from a2wsgi import WSGIMiddleware
+from flask import request, session, redirect, url_for, jsonify, render_template
+from werkzeug.exceptions import HTTPException
+
+import wsgi   # 시드 DB 복원 + Flask 앱 로드
+
+ASGI_WSGI_THREADS = int(os.getenv("ASGI_WSGI_THREADS", "16"))     # WSGI 로 넘기는 경로용 스레드 수
+ASGI_MAX_ENGINES = int(os.getenv("ASGI_MAX_ENGINES", "32"))       # 열어 두는 async 엔진 수(DB 파일별)
+# 목록 렌더·통계 집계는 CPU 작업이라 동시에 너무 많이 돌리면 모두가 함께 늦어진다.
+# 동시에 실행하는 async 핸들러 수를 제한하고 나머지는 도착 순서대로 기다리게 한다(파일 전송은 제외).
+ASGI_MAX_ACTIVE = int(os.getenv("ASGI_MAX_ACTIVE", "4"))
+DOWNLOAD_CHUNK = 256 * 1024
+
+flask_app = wsgi.app
+wsgi_fallback = WSGIMiddleware(flask_app, workers=ASGI_WSGI_THREADS)
+
+try:
+    core = import_module("advice6.app")   # advice6 패키지는 app(Flask 객체)을 내보내므로 모듈로 가져옴
+    from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
+    import aiosqlite  # noqa: F401  (sqlite+aiosqlite 드라이버)
+    ASYNC_ENABLED = core.backend.name == "sqlite" and flask_app is core.app
+except ImportError:
+    core = None
+    ASYNC_ENABLED = False
+
+
+class AsyncEngines:
+    """DB 파일별 async 엔진. 파일이 교체되면(업로드·스냅샷 갱신 = 새 inode) 엔진을 새로 만든다.
+
+    최대 max_engines 개까지 두고, 넘치면 가장 오래 안 쓴(빌려 간 연결이 없는) 엔진을 닫는다.
+    """
+
+    def __init__(self, max_engines):
+        self.max_engines = max_engines
+        self._engines = OrderedDict()   # path -> (inode, engine)
+        self._closing = set()
+
+    def get(self, path, readonly=False):
+        ino = os.stat(path).st_ino
+        hit = self._engines.get(path)
+        if hit is not None and hit[0] == ino:
+            self._engines.move_to_end(path)
+            return hit[1]
+        if hit is not None:
+            self._close(hit[1])
+        uri = "file:" + pathname2url(os.path.abspath(path))
+        uri += "?mode=ro&immutable=1&uri=true" if readonly else "?uri=true"
+        eng = create_async_engine("sqlite+aiosqlite:///" + uri)
+        self._engines[path] = (ino, eng)
+        for key in list(self._engines):
+            if len(self._engines) <= self.max_engines:
+                break
+            old = self._engines[key][1]
+            if old.pool.checkedout() == 0:
+                del self._engines[key]
+                self._close(old)
+        return eng
+
+    def _close(self, eng):
+        task = asyncio.ensure_future(eng.dispose())
+        self._closing.add(task)
+        task.add_done_callback(self._closing.discard)
+
+
+engines = AsyncEngines(ASGI_MAX_ENGINES)
+_active = None   # asyncio.Semaphore(ASGI_MAX_ACTIVE) — 이벤트 루프 안에서 만든다
+
+
+async def live_engine():
+    tenant = core.current_tenant()
+    if not tenant.is_default:
+        # 처음 여는 학교 DB 는 마이그레이션부터(동기 엔진 풀이 처리)
+        await asyncio.to_thread(core.tenant_engines.get, tenant)
+    return engines.get(tenant.sqlite_path)
+
+
+class FileStream:
+    """핸들러가 돌려주면 본문을 파일에서 조금씩 읽어 보낸다(헤더는 Flask 응답으로 처리)."""
+
+    def __init__(self, path, download_name):
+        self.path = path
+        self.download_name = download_name
+        self.file = None
+
+    def open(self):
+        # 요청 컨텍스트(DB 게이트) 안에서 연다. 이후 파일이 교체돼도 열린 fd 로 끝까지 보낸다.
+        self.file = open(self.path, "rb")
+        return os.fstat(self.file.fileno()).st_size
+
+    def close(self):
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+
+
+# ====== async 핸들러 (Flask 뷰와 같은 로직: advice6.app 의 공용 함수 사용) ======
+async def consult_list():
+    if 'teacher_id' not in session:
+        return redirect('/teacher_login')
+    grade, class_num, archive_year, archive_years = core.consult_list_scope()
+    if archive_year:   # 보관 학년도는 ATTACH 조회라 스레드에서
+        rows = await asyncio.to_thread(core.archived_consult_rows, archive_year, grade, class_num)
+    else:
+        async with AsyncSession(await live_engine()) as s:
+            rows = (await s.execute(core.consult_list_query(grade, class_num))).all()
+    return core.render_consult_list(rows, grade, class_num, archive_year, archive_years)
+
+
+async def my_requests():
+    ctx = session.get('myreq_ctx')
+    if not ctx:
+        return redirect(url_for('check_request'))
+    query, resolved = core.my_requests_query(ctx)
+    async with AsyncSession(await live_engine()) as s:
+        matched = core.finish_my_requests(ctx, (await s.scalars(query)).all(), resolved)
+        logs = (await s.scalars(core.my_request_logs_query(matched))).all() if matched else []
+    return render_template('my_requests.html', data=core.my_request_rows(matched, logs), name=ctx['name'])
+
+
+async def api_stats():
+    if 'teacher_id' not in session:
+        return jsonify({"ok": False, "error": "login required"}), 401
+    scope = (request.args.get('year') or '').strip()
+    if scope:   # 보관 학년도 포함 범위는 ATTACH 조회라 스레드에서
+        stats = await asyncio.to_thread(core.stats_for_scope, scope)
+        return jsonify(core.stats_payload(stats))
+    tenant = core.current_tenant()
+    if core.ANALYTICS_SNAPSHOT:
+        as_of = await asyncio.to_thread(core.fresh_snapshot, tenant)
+        eng = engines.get(tenant.snapshot_path, readonly=True)
+    else:
+        as_of, eng = None, await live_engine()
+    # 동기 집계 코드를 그대로 실행. yield_per 청크를 가져올 때마다 이벤트 루프에 양보한다.
+    async with AsyncSession(eng) as s:
+        stats = await s.run_sync(core.live_stats)
+    stats["as_of"] = core.format_as_of(as_of)
+    return jsonify(core.stats_payload(stats))
+
+
+async def admin_download_db():
+    if not core.admin_ok(request.args.get("pw")):
+        return "Forbidden", 403
+    path, name = core.live_db_download()
+    if not os.path.exists(path):
+        return "DB not found", 404
+    return FileStream(path, name)
+
+
+async def download_backup_file(fname):
+    if not core.admin_ok(request.args.get("pw")):
+        return "Forbidden", 403
+    path = core.backup_file_path(fname)
+    if path is None:
+        return "Bad name", 400
+    if not os.path.isfile(path):
+        return "Not Found", 404
+    return FileStream(path, fname)
+
+
+ASYNC_VIEWS = {
+    'consult_list': consult_list,
+    'my_requests': my_requests,
+    'api_stats': api_stats,
+    'admin_download_db': admin_download_db,
+    'download_backup_file': download_backup_file,
+}
+# ===========================
+
+
+def _environ(scope):
+    """GET 요청의 ASGI scope → WSGI environ (Flask 요청 컨텍스트·세션·url_for 용)."""
+    server = scope.get("server") or ("localhost", 80)
+    client = scope.get("client") or ("", 0)
+    environ = {
+        "REQUEST_METHOD": scope["method"],
+        "SCRIPT_NAME": scope.get("root_path", "").encode().decode("latin-1"),
+        "PATH_INFO": scope["path"].encode().decode("latin-1"),
+        "QUERY_STRING": scope.get("query_string", b"").decode("latin-1"),
+        "SERVER_NAME": server[0],
+        "SERVER_PORT": str(server[1]),
+        "SERVER_PROTOCOL": "HTTP/" + scope.get("http_version", "1.1"),
+        "REMOTE_ADDR": client[0],
+        "wsgi.url_scheme": scope.get("scheme", "http"),
+        "wsgi.input": io.BytesIO(b""),
+        "wsgi.errors": sys.stderr,
+        "wsgi.multithread": True,
+        "wsgi.multiprocess": True,
+        "wsgi.run_once": False,
+    }
+    for name, value in scope["headers"]:
+        key = name.decode("latin-1").upper().replace("-", "_")
+        if key not in ("CONTENT_TYPE", "CONTENT_LENGTH"):
+            key = "HTTP_" + key
+        value = value.decode("latin-1")
+        environ[key] = environ[key] + "," + value if key in environ else value
+    if core.TENANT_MODE == 'path':
+        core.split_tenant_path(environ)
+    return environ
+
+
+def _match(environ):
+    """Flask url_map 으로 엔드포인트를 찾아 async 핸들러가 있으면 (핸들러, 인자)."""
+    try:
+        endpoint, args = flask_app.url_map.bind_to_environ(environ).match()
+    except HTTPException:
+        return None, None
+    return ASYNC_VIEWS.get(endpoint), args
+
+
+async def _send(send, resp, stream=None):
+    headers = [(k.lower().encode("latin-1"), v.encode("latin-1")) for k, v in resp.headers.items()]
+    await send({"type": "http.response.start", "status": resp.status_code, "headers": headers})
+    if stream is None:
+        await send({"type": "http.response.body", "body": resp.get_data()})
+        return
+    remaining = resp.content_length   # 보내는 중에 파일이 커져도 헤더의 길이만큼만
+    while remaining > 0:
+        chunk = await asyncio.to_thread(stream.file.read, min(DOWNLOAD_CHUNK, remaining))
+        if not chunk:
+            break
+        remaining -= len(chunk)
+        await send({"type": "http.response.body", "body": chunk, "more_body": True})
+    await send({"type": "http.response.body", "body": b""})
+
+
+def _file_response(stream):
+    resp = flask_app.response_class(status=200, direct_passthrough=True)
+    resp.content_type = mimetypes.guess_type(stream.download_name)[0] or "application/octet-stream"
+    resp.content_length = stream.open()
+    resp.headers["Content-Disposition"] = f'attachment; filename="{stream.download_name}"'
+    return resp
+
+
+async def _dispatch(view, args, environ, send):
+    """Flask 요청 훅(학교 결정·속도 제한·DB 게이트·세션 저장·압축)을 그대로 거쳐 async 핸들러 실행."""
+    global _active
+    if _active is None:
+        _active = asyncio.Semaphore(ASGI_MAX_ACTIVE)
+    ctx = flask_app.request_context(environ)
+    ctx.push()
+    error = None
+    stream = None
+    try:
+        async with _active:
+            try:
+                rv = await asyncio.to_thread(flask_app.preprocess_request)
+                if rv is None:
+                    rv = await view(**args)
+                if isinstance(rv, FileStream):
+                    stream, rv = rv, _file_response(rv)
+            except Exception as e:
+                rv = flask_app.handle_user_exception(e)
+            resp = flask_app.make_response(rv)
+            resp = await asyncio.to_thread(flask_app.process_response, resp)
+    except Exception as e:
+        error = e
+        if stream is not None:
+            stream.close()
+            stream = None
+        resp = flask_app.make_response(flask_app.handle_exception(e))
+    try:
+        if stream is not None:
+            # 파일 본문은 열린 fd 로 보내므로 느린 다운로드가 DB 게이트를 붙잡지 않게 먼저 정리
+            # (WSGI 의 send_file 도 컨텍스트를 닫은 뒤 본문을 보낸다)
+            ctx.pop(error)
+            ctx = None
+        await _send(send, resp, stream)
+    finally:
+        if ctx is not None:
+            ctx.pop(error)   # 일반 응답의 teardown(DB 게이트 해제 등)은 응답을 다 보낸 뒤
+        if stream is not None:
+            stream.close()
+
+
+async def app(scope, receive, send):
+    if scope["type"] == "http" and ASYNC_ENABLED and scope["method"] == "GET":
+        environ = _environ(scope)
+        view, args = _match(environ)
+        if view is not None:
+            return await _dispatch(view, args, environ, send)
+    if scope["type"] == "lifespan":
+        while True:
+            message = await receive()
+            if message["type"] == "lifespan.startup":
+                await send({"type": "lifespan.startup.complete"})
+            elif message["type"] == "lifespan.shutdown":
+                await send({"type": "lifespan.shutdown.complete"})
+                return
+    return await wsgi_fallback(scope, receive, send)
+
+
+application = app
@@ -0,0 +1,72 @@
+# bench/_env.py  ── 벤치마크 공용 준비
+# 임시 폴더에 시드 DB 사본을 만들고 그 파일로 앱을 띄운다.
+# 저장소의 advice6/consulting.db·backups·sessions.db 는 건드리지 않는다.
+import os, sys, atexit, shutil, random, sqlite3, tempfile, logging
+from importlib import import_module
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SEED = os.path.join(ROOT, "seed", "consulting-seed.db")
+TOPICS = ["친구", "학업", "가족", "진로", "건강"]
+
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+
+def workdir():
+    d = tempfile.mkdtemp(prefix="advice6-bench-")
+    atexit.register(shutil.rmtree, d, ignore_errors=True)
+    return d
+
+
+def make_db(d, n_requests=0, answered_every=3):
+    """시드 DB 사본 + 임의 신청 n_requests 건(answered_every 건마다 답변 1건). 경로 반환."""
+    path = os.path.join(d, "consulting.db")
+    shutil.copyfile(SEED, path)
+    if n_requests:
+        rnd = random.Random(0)
+        con = sqlite3.connect(path)
+        con.executemany(
+            "INSERT INTO consult_request (grade, class_num, number, name, password, category, topic, content, date) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            [(1 + i % 6, 1 + i % 8, 1 + i % 30, "학생", "1234", "상담", rnd.choice(TOPICS), "x" * 200,
+              f"2025-{1 + i % 12:02d}-{1 + i % 28:02d} {i % 24:02d}:{i % 60:02d}") for i in range(n_requests)])
+        con.execute("INSERT INTO consult_log (request_id, teacher_name, memo, date) "
+                    "SELECT id, 't', 'memo', substr(date, 1, 8) || '28 23:59' FROM consult_request "
+                    "WHERE id % ? = 0", (answered_every,))
+        con.commit()
+        con.close()
+    return path
+
+
+def bench_env(d, db_path, **extra):
+    """앱 프로세스용 환경 변수(모든 런타임 파일을 d 아래로)."""
+    env = {
+        "SQLITE_PATH": db_path,
+        "ARCHIVE_DIR": os.path.join(d, "archive"),
+        "SESSION_DB": os.path.join(d, "sessions.db"),
+        "RATE_LIMIT_DB": os.path.join(d, "ratelimit.db"),
+        "TEMPLATE_CACHE_DIR": os.path.join(d, "jinja_cache"),
+        "RATE_LIMIT_ENABLED": "0",
+    }
+    env.update({k: str(v) for k, v in extra.items()})
+    return env
+
+
+def load_app(d, db_path, **extra):
+    """현재 프로세스에서 advice6.app 모듈을 띄운다(백업도 d 아래로)."""
+    os.environ.update(bench_env(d, db_path, **extra))
+    logging.disable(logging.CRITICAL)
+    m = import_module("advice6.app")
+    m.DEFAULT_TENANT.backup_dir = os.path.join(d, "backups")
+    m.DEFAULT_TENANT.state_path = os.path.join(d, "backups", ".state.json")
+    os.makedirs(m.DEFAULT_TENANT.backup_dir, exist_ok=True)
+    return m
+
+
+def login_teacher(m, client, grade=1, class_num=1):
+    with m.app.app_context():
+        if not m.Teacher.query.filter_by(username="bench").first():
+            m.db.session.add(m.Teacher(username="bench", password="pw", grade=grade,
+                                       class_num=class_num, is_approved=True))
+            m.db.session.commit()
+    client.post("/teacher_login", data={"username": "bench", "password": "pw"})
@@ -0,0 +1,116 @@
+# bench/concurrency.py  ── gunicorn gthread(Procfile 설정) vs uvicorn asgi:app 동시 연결 수용량
+#   python bench/concurrency.py gthread|gthread8|asgi [느린 다운로드 수] [동시 consult_list 수]
+#
+# 신청 10만 건 DB(약 35MB)로 서버 1개 프로세스를 띄우고
+#   1) 느린 클라이언트(20ms 마다 64KB 읽음)가 /admin/download_db 를 받는 동안 /healthz, /consult_list 지연
+#   2) /consult_list 동시 요청의 전체 시간·p50·p99
+# 를 잰다. 설정마다 따로 실행해서 비교한다.
+import os, sys, json, time, sqlite3, asyncio, subprocess
+from urllib.parse import urlencode
+
+import _env
+
+PORT = int(os.getenv("BENCH_PORT", "8790"))
+SERVERS = {
+    "gthread": ["gunicorn", "-w", "1", "-k", "gthread", "-t", "120", "--preload",
+                "--bind", f"127.0.0.1:{PORT}", "wsgi:app"],
+    "gthread8": ["gunicorn", "-w", "1", "-k", "gthread", "--threads", "8", "-t", "120", "--preload",
+                 "--bind", f"127.0.0.1:{PORT}", "wsgi:app"],
+    "asgi": [sys.executable, "-m", "uvicorn", "asgi:app", "--port", str(PORT), "--log-level", "warning"],
+}
+
+
+async def http(method, url, body=b"", headers=None, slow=None, timeout=300):
+    """(응답 앞부분, 받은 바이트, 첫 바이트까지 초, 전체 초)."""
+    r, w = await asyncio.wait_for(asyncio.open_connection("127.0.0.1", PORT), timeout)
+    hd = {"Host": "bench", "Connection": "close", "Content-Length": str(len(body)), **(headers or {})}
+    w.write(f"{method} {url} HTTP/1.1\r\n".encode()
+            + b"".join(f"{k}: {v}\r\n".encode() for k, v in hd.items()) + b"\r\n" + body)
+    await w.drain()
+    t0 = time.perf_counter()
+    first, n, head = None, 0, b""
+    while True:
+        chunk = await asyncio.wait_for(r.read(65536), timeout)
+        if not chunk:
+            break
+        if first is None:
+            first = time.perf_counter() - t0
+        n += len(chunk)
+        if len(head) < 4096:
+            head += chunk[:4096]
+        if slow:
+            await asyncio.sleep(slow)
+    w.close()
+    return head, n, first, time.perf_counter() - t0
+
+
+async def wait_ready(timeout=60):
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            await http("GET", "/healthz", timeout=5)
+            return
+        except OSError:
+            if time.monotonic() > deadline:
+                raise
+            await asyncio.sleep(0.2)
+
+
+async def measure(downloads, concurrent):
+    await wait_ready()
+    head, *_ = await http("POST", "/teacher_login", urlencode({"username": "bench", "password": "pw"}).encode(),
+                          {"Content-Type": "application/x-www-form-urlencoded"})
+    cookie = [line.split(b":", 1)[1].split(b";")[0].strip().decode()
+              for line in head.split(b"\r\n") if line.lower().startswith(b"set-cookie")][0]
+    auth = {"Cookie": cookie}
+    res = {}
+
+    dls = [asyncio.create_task(http("GET", "/admin/download_db?pw=PAJU2025", slow=0.02)) for _ in range(downloads)]
+    await asyncio.sleep(0.5)
+    t = time.perf_counter()
+    await http("GET", "/healthz")
+    res["healthz_during_downloads_ms"] = round((time.perf_counter() - t) * 1e3)
+    t = time.perf_counter()
+    await http("GET", "/consult_list", headers=auth)
+    res["consult_list_during_downloads_ms"] = round((time.perf_counter() - t) * 1e3)
+    out = await asyncio.gather(*dls)
+    res["last_download_ttfb_s"] = round(max(o[2] for o in out), 1)
+    res["all_downloads_done_s"] = round(max(o[3] for o in out), 1)
+
+    t = time.perf_counter()
+    out = await asyncio.gather(*[http("GET", "/consult_list?page=2", headers=auth) for _ in range(concurrent)],
+                               return_exceptions=True)
+    wall = time.perf_counter() - t
+    lat = sorted(o[3] for o in out if not isinstance(o, Exception) and o[0].startswith(b"HTTP/1.1 200"))
+    res[f"c{concurrent}_consult_list"] = {
+        "ok": len(lat), "wall_s": round(wall, 1),
+        "p50_ms": round(lat[len(lat) // 2] * 1e3) if lat else None,
+        "p99_ms": round(lat[max(0, int(len(lat) * .99) - 1)] * 1e3) if lat else None,
+    }
+    return res
+
+
+def main():
+    server = sys.argv[1] if len(sys.argv) > 1 else "asgi"
+    downloads = int(sys.argv[2]) if len(sys.argv) > 2 else 8
+    concurrent = int(sys.argv[3]) if len(sys.argv) > 3 else 200
+    d = _env.workdir()
+    path = _env.make_db(d, n_requests=100000)
+    con = sqlite3.connect(path)
+    con.execute("INSERT INTO teacher (username, password, grade, class_num, is_approved) "
+                "VALUES ('bench', 'pw', 1, 1, 1)")
+    con.commit()
+    con.close()
+    env = {**os.environ, **_env.bench_env(d, path, COMPRESS_ENABLED="0"), "PYTHONPATH": _env.ROOT}
+    srv = subprocess.Popen(SERVERS[server], cwd=_env.ROOT, env=env,
+                           stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        res = asyncio.run(measure(downloads, concurrent))
+    finally:
+        srv.terminate()
+        srv.wait()
+    print(server, json.dumps(res, ensure_ascii=False, indent=2))
+
+
+if __name__ == "__main__":
+    main()
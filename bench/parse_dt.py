@@ -0,0 +1,52 @@
+# bench/parse_dt.py  ── 날짜 파싱 마이크로벤치마크
+#   python bench/parse_dt.py [문자열 수] [서로 다른 값 수]
+#
+# 예전 strptime 순회(형식 4개를 차례로 시도) vs parse_dt 빠른 경로 / LRU 캐시 / parse_dt_many.
+import sys, random, timeit
+from datetime import datetime
+
+import _env
+
+
+def old_parse_dt(s, KST):
+    """통계 개선 전의 parse_dt."""
+    if not s:
+        return None
+    for fmt in ('%Y-%m-%d %H:%M', '%Y/%m/%d %H:%M', '%Y.%m.%d %H:%M', '%Y-%m-%dT%H:%M'):
+        try:
+            return datetime.strptime(s, fmt).replace(tzinfo=KST)
+        except ValueError:
+            continue
+    return None
+
+
+def main():
+    total = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+    distinct = int(sys.argv[2]) if len(sys.argv) > 2 else 2000
+    d = _env.workdir()
+    m = _env.load_app(d, _env.make_db(d))
+
+    rnd = random.Random(1)
+    uniq = [f"2025-{rnd.randint(1, 12):02d}-{rnd.randint(1, 28):02d} "
+            f"{rnd.randint(0, 23):02d}:{rnd.randint(0, 59):02d}" for _ in range(distinct)]
+    vals = [uniq[i % distinct] for i in range(total)]
+    assert [old_parse_dt(v, m.KST) for v in vals] == m.parse_dt_many(vals)
+
+    def run(fn, n=5):
+        return timeit.timeit(fn, number=n) / n
+
+    t_old = run(lambda: [old_parse_dt(v, m.KST) for v in vals])
+    t_fast = run(lambda: [m._parse_dt_uncached(v) for v in vals])
+    m._parse_dt_cached.cache_clear()
+    [m.parse_dt(v) for v in vals]   # 캐시 데우기
+    t_cached = run(lambda: [m.parse_dt(v) for v in vals])
+    t_many = run(lambda: m.parse_dt_many(vals))
+
+    print(f"{total} date strings ({distinct} distinct)")
+    for label, t in [("old strptime loop", t_old), ("fast path", t_fast),
+                     ("LRU cached", t_cached), ("parse_dt_many", t_many)]:
+        print(f"  {label:18s} {t * 1e3:8.2f} ms  ({t_old / t:6.1f}x)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,50 @@
+# bench/submit.py  ── 학생 신청(POST /student_request) 처리량
+#   python bench/submit.py [스레드 수] [스레드당 신청 수]
+#
+# 직접 커밋(GROUP_COMMIT_ENABLED=0) vs 그룹 커밋. 설정마다 새 프로세스·새 DB 사본에서 잰다.
+import os, sys, time, subprocess, threading
+
+import _env
+
+FORM = dict(applicant_type="학생", grade_student="1", class_num_student="1", number_student="3",
+            name_student="홍길동", content="상담 부탁드립니다.", topic="진로", password="1234")
+
+
+def child(threads, per_thread):
+    d = _env.workdir()
+    m = _env.load_app(d, _env.make_db(d))
+    codes = {}
+    lock = threading.Lock()
+
+    def worker():
+        c = m.app.test_client()
+        for _ in range(per_thread):
+            code = c.post("/student_request", data=FORM).status_code
+            with lock:
+                codes[code] = codes.get(code, 0) + 1
+
+    ths = [threading.Thread(target=worker) for _ in range(threads)]
+    t0 = time.perf_counter()
+    for t in ths:
+        t.start()
+    for t in ths:
+        t.join()
+    elapsed = time.perf_counter() - t0
+    label = "group commit " if m.GROUP_COMMIT_ENABLED else "direct commit"
+    print(f"  {label} {threads * per_thread / elapsed:7.0f} submissions/s  status={codes}", flush=True)
+
+
+def main():
+    threads = sys.argv[1] if len(sys.argv) > 1 else "16"
+    per_thread = sys.argv[2] if len(sys.argv) > 2 else "40"
+    print(f"{threads} threads x {per_thread} submissions")
+    for enabled in ("0", "1"):
+        env = {**os.environ, "GROUP_COMMIT_ENABLED": enabled}
+        subprocess.run([sys.executable, __file__, "--child", threads, per_thread], env=env, check=True)
+
+
+if __name__ == "__main__":
+    if sys.argv[1:2] == ["--child"]:
+        child(int(sys.argv[2]), int(sys.argv[3]))
+    else:
+        main()
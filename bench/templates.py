@@ -0,0 +1,51 @@
+# bench/templates.py  ── 새 프로세스의 첫 요청 지연 + 응답 크기
+#   python bench/templates.py
+#
+# 템플릿 캐시 없음(첫 요청에서 컴파일) vs 부팅 시 바이트코드 캐시에서 미리 로드.
+# 응답 크기는 압축 안 함 vs gzip. 측정마다 새 프로세스·새 DB 사본을 쓴다.
+import os, sys, time, tempfile, subprocess
+
+import _env
+
+URLS = ("/statistics", "/consult_list", "/student_request")
+
+
+def child():
+    d = _env.workdir()
+    t0 = time.perf_counter()
+    m = _env.load_app(d, _env.make_db(d), TEMPLATE_CACHE_DIR=os.environ["BENCH_TEMPLATE_CACHE"])
+    boot = time.perf_counter() - t0
+    c = m.app.test_client()
+    _env.login_teacher(m, c, grade=6, class_num=2)
+    out = [f"boot {boot * 1e3:6.0f} ms"]
+    for url in URLS:
+        t = time.perf_counter()
+        r = c.get(url, headers={"Accept-Encoding": os.environ.get("BENCH_ACCEPT_ENCODING", "")})
+        elapsed = time.perf_counter() - t
+        out.append(f"{url} {elapsed * 1e3:5.1f} ms {len(r.get_data()):6d} B")
+    print("  " + " | ".join(out), flush=True)
+
+
+def run(label, **env):
+    print(label)
+    subprocess.run([sys.executable, __file__, "--child"], env={**os.environ, **env}, check=True)
+
+
+def main():
+    with tempfile.TemporaryDirectory() as empty, tempfile.TemporaryDirectory() as warm:
+        run("no template cache (compile on first request)",
+            BENCH_TEMPLATE_CACHE=empty, PRECOMPILE_TEMPLATES="0", COMPRESS_ENABLED="0")
+        # 한 번 띄워 캐시를 채운 뒤, 새 프로세스에서 다시 잰다
+        subprocess.run([sys.executable, __file__, "--child"], check=True, stdout=subprocess.DEVNULL,
+                       env={**os.environ, "BENCH_TEMPLATE_CACHE": warm})
+        run("bytecode cache, precompiled at boot",
+            BENCH_TEMPLATE_CACHE=warm, COMPRESS_ENABLED="0")
+        run("bytecode cache + gzip",
+            BENCH_TEMPLATE_CACHE=warm, BENCH_ACCEPT_ENCODING="gzip")
+
+
+if __name__ == "__main__":
+    if sys.argv[1:2] == ["--child"]:
+        child()
+    else:
+        main()